@@ -9,8 +9,45 @@ create table if not exists public.karma_messages
 	channel_id bigint not null
 );
 
-create index if not exists karma_messages_author_index
-	on public.karma_messages (author_id);
+drop index if exists public.karma_messages_author_index;
+
+create index if not exists karma_messages_author_message_index
+	on public.karma_messages (author_id, message_id);
+
+create table if not exists public.invites
+(
+	code text not null
+		constraint invites_pk
+			primary key,
+	inviter_id bigint not null
+);
+
+create table if not exists public.join_events
+(
+	id bigserial not null
+		constraint join_events_pk
+			primary key,
+	guild_id bigint not null,
+	member_id bigint not null,
+	inviter_id bigint,
+	joined_at bigint not null
+);
+
+create index if not exists join_events_inviter_index
+	on public.join_events (inviter_id, joined_at);
+
+create table if not exists public.inviter_stats
+(
+	guild_id bigint not null,
+	inviter_id bigint not null,
+	month integer not null,
+	joins integer default 0 not null,
+	constraint inviter_stats_pk
+		primary key (guild_id, inviter_id, month)
+);
+
+create index if not exists inviter_stats_ranking_index
+	on public.inviter_stats (guild_id, month, joins);
 
 create table if not exists public.guilds_config
 (
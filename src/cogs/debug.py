@@ -0,0 +1,216 @@
+import asyncio
+import resource
+import sys
+from io import BytesIO
+from typing import TYPE_CHECKING, Literal
+
+import discord
+from discord.ext import commands
+from loguru import logger
+
+from core.context import MitsuakyContext
+from core.profiler import SamplingProfiler
+
+if TYPE_CHECKING:
+    from src.main import MitBot
+
+# Discord message limit minus some room for the code block markup
+MAX_INLINE_LENGTH = 1900
+MAX_PROFILE_SECONDS = 120
+# Worker threads sampled besides the event loop, by name prefix
+PROFILED_THREADS = ("tarot",)
+
+
+def process_memory() -> tuple[int | None, int]:
+    """Returns the current resident set size (None if unknown) and the peak one, in bytes."""
+    rss = None
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1]) * 1024
+                    break
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return rss, peak if sys.platform == "darwin" else peak * 1024
+
+
+def format_bytes(size: int | None) -> str:
+    if size is None:
+        return "unknown"
+    return f"{size / 1024 / 1024:.1f} MiB"
+
+
+class Debug(commands.Cog):
+    """Owner only diagnostics, in the same spirit as jishaku."""
+
+    def __init__(self, bot: "MitBot") -> None:
+        self.bot = bot
+        self.profiler = SamplingProfiler(PROFILED_THREADS)
+
+    async def cog_load(self) -> None:
+        logger.info("Loading Debug cog")
+
+    async def cog_unload(self) -> None:
+        logger.info("Unloading Debug cog")
+
+    async def cog_check(self, ctx: MitsuakyContext) -> bool:  # type: ignore
+        return await self.bot.is_owner(ctx.author)
+
+    @commands.group(name="debug", invoke_without_command=True)
+    async def debug(self, ctx: MitsuakyContext) -> None:
+        await ctx.send_help(ctx.command)
+
+    @debug.command(name="stalls")
+    async def stalls(self, ctx: MitsuakyContext, count: int = 5) -> None:
+        """Lists the worst recent event loop stalls and what was running during them."""
+        if self.bot.loop_monitor is None:
+            await ctx.send("The loop monitor is disabled.")
+            return
+
+        stalls = self.bot.loop_monitor.worst(max(1, min(count, 20)))
+        if not stalls:
+            await ctx.send(f"No stalls above {self.bot.loop_monitor.settings.threshold * 1000:.0f}ms recorded.")
+            return
+
+        summary = "\n".join(
+            f"{i}. {stall.duration * 1000:.0f}ms at {discord.utils.format_dt(stall.started_at, 'T')} in `{stall.task}`"
+            for i, stall in enumerate(stalls, start=1)
+        )
+        report = "\n\n".join(
+            f"#{i} {stall.duration * 1000:.0f}ms in {stall.task}\n{stall.stack or '<stack not captured>'}"
+            for i, stall in enumerate(stalls, start=1)
+        )
+        if len(summary) + len(report) < MAX_INLINE_LENGTH:
+            await ctx.send(f"{summary}\n```py\n{report}\n```")
+            return
+
+        await ctx.send(summary, file=discord.File(BytesIO(report.encode()), filename="stalls.txt"))
+
+    @debug.command(name="memory")
+    async def memory(self, ctx: MitsuakyContext) -> None:
+        """Shows approximate cache sizes and process memory, to tune the [cache] settings."""
+        guilds = self.bot.guilds
+        cached_members = sum(len(guild.members) for guild in guilds)
+        total_members = sum(guild.member_count or 0 for guild in guilds)
+        channels = sum(len(guild.channels) for guild in guilds)
+        roles = sum(len(guild.roles) for guild in guilds)
+        voice_states = sum(len(guild._voice_states) for guild in guilds)  # type: ignore
+        max_messages = self.bot._connection.max_messages
+        rss, peak = process_memory()
+        flags = self.bot._connection.member_cache_flags
+
+        lines = [
+            f"Guilds: {len(guilds)} (chunked: {sum(guild.chunked for guild in guilds)})",
+            f"Members: {cached_members} cached of {total_members}",
+            f"Users: {len(self.bot.users)}",
+            f"Messages: {len(self.bot.cached_messages)} of {max_messages if max_messages is not None else 'disabled'}",
+            f"Channels: {channels}, roles: {roles}, emojis: {len(self.bot.emojis)}, voice states: {voice_states}",
+            f"Member cache flags: voice={flags.voice}, joined={flags.joined}",
+            f"RSS: {format_bytes(rss)} (peak {format_bytes(peak)})",
+        ]
+        await ctx.send("```\n" + "\n".join(lines) + "\n```")
+
+    @debug.command(name="profile")
+    async def profile(
+        self,
+        ctx: MitsuakyContext,
+        seconds: float = 10,
+        output: Literal["collapsed", "speedscope"] = "collapsed",
+        memory: bool = False,
+    ) -> None:
+        """Samples the event loop and tarot threads, and uploads the stacks for a flamegraph.
+
+        With memory, also lists where memory was allocated while sampling.
+        """
+        if self.profiler.running:
+            await ctx.send("A profile is already being taken.")
+            return
+
+        seconds = max(1.0, min(seconds, MAX_PROFILE_SECONDS))
+        await ctx.send(f"Profiling for {seconds:g} seconds...")
+        result = await self.profiler.profile(seconds, trace_memory=memory)
+
+        if output == "speedscope":
+            files = [discord.File(BytesIO(result.speedscope().encode()), filename="profile.speedscope.json")]
+        else:
+            files = [discord.File(BytesIO(result.collapsed().encode()), filename="profile.folded")]
+        if result.memory is not None:
+            files.append(discord.File(BytesIO(result.memory.encode()), filename="allocations.txt"))
+
+        threads = sorted({thread for thread, _ in result.stacks})
+        await ctx.send(
+            f"{result.samples} samples of {', '.join(threads) or 'no thread'} over {seconds:g} seconds.",
+            files=files,
+        )
+
+    @debug.command(name="jobs")
+    async def jobs(self, ctx: MitsuakyContext) -> None:
+        """Lists the scheduled jobs with their run and failure stats."""
+        jobs = self.bot.scheduler.jobs.values()
+        if not jobs:
+            await ctx.send("No scheduled jobs.")
+            return
+
+        lines = []
+        for job in jobs:
+            last_run = (
+                f"{job.last_run:%H:%M:%S} in {job.last_duration:.2f}s"
+                if job.last_run and job.last_duration is not None
+                else "never"
+            )
+            next_run = f"{job.next_run:%H:%M:%S}" if job.next_run else "-"
+            lines.append(
+                f"{job.name} ({job.schedule}, owner {job.owner or '-'}): {job.runs} runs, {job.failures} failed, "
+                f"{job.timeouts} timed out, {job.skipped} skipped, {len(job.running)} running\n"
+                f"  last {last_run}, next {next_run}" + (f", last error: {job.last_error}" if job.last_error else "")
+            )
+        await ctx.send("```\n" + "\n".join(lines) + "\n```")
+
+    @debug.group(name="cluster", invoke_without_command=True)
+    async def cluster(self, ctx: MitsuakyContext) -> None:
+        """Shows the health of every cluster, as last reported to the launcher."""
+        if self.bot.cluster is None:
+            await ctx.send("The bot is not running in cluster mode.")
+            return
+
+        try:
+            status = await self.bot.cluster.request("status")
+        except (ConnectionError, asyncio.TimeoutError):
+            await ctx.send("The cluster launcher is not reachable.")
+            return
+
+        lines = []
+        for cluster_id, health in status.items():
+            state = "ready" if health.get("ready") else "not ready"
+            if not health["connected"]:
+                state = "disconnected"
+            latencies = [shard["latency"] for shard in health.get("shard_health", {}).values()]
+            latency = f"{max(latencies) * 1000:.0f}ms" if latencies else "-"
+            lines.append(
+                f"#{cluster_id} shards {health['shards']}: {state}, {health.get('guilds', 0)} guilds, "
+                f"worst latency {latency}, {health['restarts']} restarts"
+            )
+        await ctx.send("```\n" + "\n".join(lines) + "\n```")
+
+    @cluster.command(name="reload")
+    async def cluster_reload(self, ctx: MitsuakyContext, extension: str) -> None:
+        """Reloads an extension in every cluster."""
+        if self.bot.cluster is None:
+            await self.bot.reload_extension(extension)
+            await ctx.send(f"Reloaded {extension}.")
+            return
+
+        try:
+            results = await self.bot.cluster.request("reload_extension", name=extension)
+        except (ConnectionError, asyncio.TimeoutError):
+            await ctx.send("The cluster launcher is not reachable.")
+            return
+        lines = [f"#{cluster_id}: {result}" for cluster_id, result in results.items()]
+        await ctx.send(f"Reloaded {extension}:\n```\n" + "\n".join(lines) + "\n```")
+
+
+async def setup(bot: "MitBot") -> None:
+    await bot.add_cog(Debug(bot))
@@ -1,4 +1,5 @@
 import enum
+from collections import defaultdict
 from typing import TYPE_CHECKING
 
 import asyncio
@@ -7,11 +8,15 @@ from discord import app_commands
 from discord.ext import commands
 from loguru import logger
 
+from core.database import ALL_TIME, month_key
+from core.ratelimit import Priority, route_key
 
 if TYPE_CHECKING:
     from src.main import MitBot
 
 MAX_AGE_SECONDS = 60 * 60 * 24  # 1 day
+RECONCILE_INTERVAL_SECONDS = 60 * 30  # 30 minutes
+TOP_INVITERS = 10
 
 # For this cog to work, the bot needs,
 # besides the default permissions, theses permissions:
@@ -88,15 +93,33 @@ class GiveVerifyRole(discord.ui.View):
 class Invite(commands.Cog):
     def __init__(self, bot: "MitBot") -> None:
         self.bot = bot
+        # Keyed by guild, so each cluster only holds the guilds of its own shards
         self.invites: dict[int, list[discord.Invite]] = {}
-        self.lock = asyncio.Lock()
+        # Joins are serialized per guild, joins in different guilds don't wait on each other
+        self.locks: defaultdict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
         self.ready = False
 
     async def cog_load(self) -> None:
         logger.info("Loading Invite cog")
+        self.bot.scheduler.add_job(
+            "invite reconciliation",
+            self.reconcile_invites,
+            interval=RECONCILE_INTERVAL_SECONDS,
+            jitter=60,
+            timeout=300,
+            owner=self.qualified_name,
+        )
 
     async def cog_unload(self) -> None:
         logger.info("Unloading Invite cog")
+        await self.bot.scheduler.remove_owner(self.qualified_name)
+
+    async def reconcile_invites(self) -> None:
+        """Refreshes the invite cache of every guild, in case an invite event was missed."""
+        if not self.ready:
+            return
+        for guild in self.bot.guilds:
+            await self._update_invite_cache(guild, Priority.LOW)
 
     @commands.Cog.listener()
     async def on_ready(self) -> None:
@@ -155,25 +178,55 @@ class Invite(commands.Cog):
 
         invite = await channel.create_invite(max_age=MAX_AGE_SECONDS, max_uses=1)
 
-        await self.bot.prisma.invite.create(
-            data={
-                "code": invite.code,
-                "inviter_id": interaction.user.id,
-            }
-        )
+        await self.bot.db.create_invite(invite.code, interaction.user.id)
 
         await interaction.response.send_message(
             f"Created a new invite valid for 1 day with 1 use.\n{invite.url}",
             ephemeral=True,
         )
 
-    async def _update_invite_cache(self, guild: discord.Guild) -> None:
+    @app_commands.command(name="invites-stats")
+    @app_commands.guild_only()
+    @app_commands.describe(period="Count the joins of this month or of all time")
+    @app_commands.choices(
+        period=[
+            app_commands.Choice(name="This month", value="month"),
+            app_commands.Choice(name="All time", value="all"),
+        ]
+    )
+    async def invites_stats(self, interaction: discord.Interaction, period: str = "month") -> None:
+        """Show who brought the most members to this guild."""
+        assert interaction.guild is not None
+        now = discord.utils.utcnow()
+        month = month_key(now) if period == "month" else ALL_TIME
+
+        top = await self.bot.db.get_top_inviters(interaction.guild.id, month, TOP_INVITERS)
+        own = await self.bot.db.get_inviter_joins(interaction.guild.id, interaction.user.id, month)
+
+        embed = discord.Embed(color=discord.Colour.green())
+        embed.title = f"Top inviters {'of ' + now.strftime('%B %Y') if month != ALL_TIME else 'of all time'}"
+        if top:
+            embed.description = "\n".join(
+                f"{position}. <@{inviter_id}>: {joins} {'member' if joins == 1 else 'members'}"
+                for position, (inviter_id, joins) in enumerate(top, start=1)
+            )
+        else:
+            embed.description = "No member joined through a known invite yet."
+        embed.set_footer(text=f"You brought {own} {'member' if own == 1 else 'members'}")
+
+        await interaction.response.send_message(embed=embed, allowed_mentions=discord.AllowedMentions.none())
+
+    async def _update_invite_cache(self, guild: discord.Guild, priority: Priority = Priority.HIGH) -> None:
         logger.debug(f"Updating invite cache for guild {guild.name}")
         try:
             if guild.unavailable:
                 return logger.warning(f"Guild {guild.name} is unavailable, skipping invite cache update")
-            invites = await guild.invites()
-            self.invites[guild.id] = invites
+            # Waits for the budget before taking the lock: member joins must not wait behind a deferred
+            # refresh. The invites are fetched under the lock so a join never sees an older list
+            async with self.bot.ratelimits.priority(priority, route_key("GET", f"/guilds/{guild.id}/invites")):
+                async with self.locks[guild.id]:
+                    invites = await guild.invites()
+                    self.invites[guild.id] = invites
             logger.debug(f"Updated cached invites for guild {guild.name}: {len(invites)} invites")
         except discord.HTTPException:
             if not guild.me.guild_permissions > REQUIRED_PERMISSIONS:
@@ -186,6 +239,7 @@ class Invite(commands.Cog):
         if invite.guild is not None:
             guild = self.bot.get_guild(invite.guild.id)
             if guild is not None:
+                # Not deferred: the next join is attributed against this cache
                 await self._update_invite_cache(guild)
 
     @commands.Cog.listener()
@@ -211,12 +265,19 @@ class Invite(commands.Cog):
                 return invite.inviter
 
             logger.debug("Invite was created by bot, checking database")
-            db_invite = await self.bot.prisma.invite.delete(where={"code": invite.code})
-            if db_invite is None:
+            inviter_id = await self.bot.db.pop_invite(invite.code)
+            if inviter_id is None:
                 logger.debug("No matching invite found in database")
                 return
-            logger.debug(f"Inviter found in database: {db_invite.inviter_id}")
-            return self.bot.get_user(db_invite.inviter_id)
+            logger.debug(f"Inviter found in database: {inviter_id}")
+            inviter = self.bot.get_user(inviter_id)
+            if inviter is None:
+                # The inviter may not be cached when the member cache is restricted
+                try:
+                    inviter = await self.bot.fetch_user(inviter_id)
+                except discord.HTTPException:
+                    return None
+            return inviter
 
         # If the invite still present, we use the other method to find the invite
         # Check which invite has a different uses count than the invite in the cache
@@ -255,16 +316,13 @@ class Invite(commands.Cog):
         logger.debug(
             f"Invite {format_invite(invite)} deleted in guild {invite.guild}, waiting for potential member join event"
         )
-        await asyncio.sleep(1)
-        await self._handle_invite_change(invite)
+        self.bot.scheduler.call_later(1, self._handle_invite_change, invite, name="invite cache update")
 
     @commands.Cog.listener()
     async def on_member_join(self, member: discord.Member) -> None:
-        async with self.lock:
-            guild = self.bot.settings.guilds.get(member.guild.id)
-            if guild is None or guild.invite_log_channel_id is None:
-                return
-
+        # Only the invite diff and the stats are serialized: the verification below can wait on a
+        # moderator indefinitely and must not block the other joins or the invite cache refreshes
+        async with self.locks[member.guild.id]:
             inviter: discord.User | None = None
             if member.guild.id in self.invites:
                 logger.debug(f"Member {member.name} joined in {member.guild.name}, checking inviter")
@@ -277,55 +335,68 @@ class Invite(commands.Cog):
                 else:
                     logger.info(f"Member {member.name} joined in {member.guild.name} but could not resolve inviter")
 
-            embed = discord.Embed(color=discord.Colour.green())
-            embed.set_thumbnail(url=member.display_avatar.with_static_format("png"))
-            embed.title = "Member joined"
-            embed.description = (
-                f"{member.mention} joined the guild.\n\n" f"Invited by {inviter.mention if inviter else 'unknown'}"
-            )
+            try:
+                await self.bot.db.record_join(
+                    member.guild.id,
+                    member.id,
+                    inviter.id if inviter else None,
+                    member.joined_at or discord.utils.utcnow(),
+                )
+            except Exception:
+                logger.exception(f"Failed to store the join of {member.name} in {member.guild.name}")
 
-            channel = self.bot.get_channel(guild.invite_log_channel_id)
-            if not isinstance(channel, discord.TextChannel):
-                return logger.warning(f"Invite log channel not found or not a text channel in {member.guild.name}")
+        # Joins are recorded for the stats in every guild, only the log message needs a channel
+        guild = self.bot.settings.guilds.get(member.guild.id)
+        if guild is None or guild.invite_log_channel_id is None:
+            return
 
-            if member.guild != self.musky_guild:
-                await channel.send(embed=embed)
-                return
+        embed = discord.Embed(color=discord.Colour.green())
+        embed.set_thumbnail(url=member.display_avatar.with_static_format("png"))
+        embed.title = "Member joined"
+        embed.description = (
+            f"{member.mention} joined the guild.\n\n" f"Invited by {inviter.mention if inviter else 'unknown'}"
+        )
 
-            view = GiveVerifyRole()
-            embed.set_footer(text="Select a role to verify the user:")
-            message = await channel.send(embed=embed, view=view, allowed_mentions=discord.AllowedMentions.none())
-            if await view.wait() is True:
-                return logger.warning("Verification view timed out")
-
-            if view.role == VerifyRoles.FURRY:
-                role = self.role_furry
-            elif view.role == VerifyRoles.FURRY_MINOR:
-                role = self.role_furry_minor
-            elif view.role == VerifyRoles.NON_FURRY:
-                role = self.role_non_furry
-            else:
-                return logger.error("Invalid role selected in the view")
-
-            if role is None:
-                await channel.send("[Error] Role not found in the guild")
-                logger.error("Role not found in the musky guild")
-            elif role in member.roles:
-                await channel.send(
-                    f"Member {member.mention} already has the role {role.mention}",
-                    allowed_mentions=discord.AllowedMentions.none(),
-                )
-                logger.info(
-                    f"Member {view.verifier.name} tried to verify {member.name} as {role.name} in {member.guild.name} but the member already has the role"
-                )
-            else:
-                logger.info(
-                    f"Member {member.name} verified as {role.name} by {view.verifier.name} in {member.guild.name}"
-                )
-                await member.add_roles(role, reason=f"User verified by {view.verifier.name}")
-                embed.description += f"\nVerified by {view.verifier.mention} as {role.mention}"
-            embed.remove_footer()
-            await message.edit(embed=embed, view=None, allowed_mentions=discord.AllowedMentions.none())
+        channel = self.bot.get_channel(guild.invite_log_channel_id)
+        if not isinstance(channel, discord.TextChannel):
+            return logger.warning(f"Invite log channel not found or not a text channel in {member.guild.name}")
+
+        if member.guild != self.musky_guild:
+            await channel.send(embed=embed)
+            return
+
+        view = GiveVerifyRole()
+        embed.set_footer(text="Select a role to verify the user:")
+        message = await channel.send(embed=embed, view=view, allowed_mentions=discord.AllowedMentions.none())
+        if await view.wait() is True:
+            return logger.warning("Verification view timed out")
+
+        if view.role == VerifyRoles.FURRY:
+            role = self.role_furry
+        elif view.role == VerifyRoles.FURRY_MINOR:
+            role = self.role_furry_minor
+        elif view.role == VerifyRoles.NON_FURRY:
+            role = self.role_non_furry
+        else:
+            return logger.error("Invalid role selected in the view")
+
+        if role is None:
+            await channel.send("[Error] Role not found in the guild")
+            logger.error("Role not found in the musky guild")
+        elif role in member.roles:
+            await channel.send(
+                f"Member {member.mention} already has the role {role.mention}",
+                allowed_mentions=discord.AllowedMentions.none(),
+            )
+            logger.info(
+                f"Member {view.verifier.name} tried to verify {member.name} as {role.name} in {member.guild.name} but the member already has the role"
+            )
+        else:
+            logger.info(f"Member {member.name} verified as {role.name} by {view.verifier.name} in {member.guild.name}")
+            await member.add_roles(role, reason=f"User verified by {view.verifier.name}")
+            embed.description += f"\nVerified by {view.verifier.mention} as {role.mention}"
+        embed.remove_footer()
+        await message.edit(embed=embed, view=None, allowed_mentions=discord.AllowedMentions.none())
 
 
 async def setup(bot: "MitBot") -> None:
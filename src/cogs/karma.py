@@ -1,17 +1,112 @@
-from typing import TYPE_CHECKING
+import asyncio
+import csv
+import gzip
+import json
+import os
+import tempfile
+from typing import IO, TYPE_CHECKING
 
 import discord
 from discord import RawReactionActionEvent, app_commands
 from discord.ext import commands
 from loguru import logger
 
+from core.database import KarmaRecord
+from core.ratelimit import Priority
+
 if TYPE_CHECKING:
     from src.main import MitBot
 
+HISTORY_PAGE_SIZE = 10
+HISTORY_TIMEOUT = 180
+# Rows read from the database and written to the export file at a time
+EXPORT_CHUNK_SIZE = 1000
+
+
+def write_rows(file: IO[str], rows: list[KarmaRecord], file_format: str) -> None:
+    if file_format == "csv":
+        csv.writer(file).writerows(rows)
+    else:
+        file.writelines(json.dumps(row._asdict()) + "\n" for row in rows)
+
+
+class KarmaHistoryView(discord.ui.View):
+    """Pages through the karma messages of a member, newest first.
+
+    Only the first and last message ids of the shown page are kept, the next page is the one right
+    before the last id and the previous page the one right after the first id.
+    """
+
+    def __init__(self, bot: "MitBot", owner_id: int, member: discord.abc.User) -> None:
+        super().__init__(timeout=HISTORY_TIMEOUT)
+        self.bot = bot
+        self.owner_id = owner_id
+        self.member = member
+        self.records: list[KarmaRecord] = []
+        self.page = 1
+        self.message: discord.InteractionMessage | None = None
+
+    async def load(self, before: int | None = None, after: int | None = None) -> None:
+        # One extra row tells whether there is a page past this one
+        records = await self.bot.db.get_karma_history(
+            self.member.id, HISTORY_PAGE_SIZE + 1, before=before, after=after
+        )
+        more = len(records) > HISTORY_PAGE_SIZE
+        if after is not None:
+            self.records = records[-HISTORY_PAGE_SIZE:]
+            self.newer.disabled = not more
+            self.older.disabled = False
+        else:
+            self.records = records[:HISTORY_PAGE_SIZE]
+            self.newer.disabled = before is None
+            self.older.disabled = not more
+
+    def embed(self) -> discord.Embed:
+        embed = discord.Embed(color=discord.Colour.green(), title=f"Karma history of {self.member.display_name}")
+        lines = []
+        for record in self.records:
+            channel = self.bot.get_channel(record.channel_id)
+            posted_at = discord.utils.format_dt(discord.utils.snowflake_time(record.message_id), "d")
+            score = record.upvotes - record.downvotes
+            if isinstance(channel, discord.abc.GuildChannel):
+                link = f"https://discord.com/channels/{channel.guild.id}/{record.channel_id}/{record.message_id}"
+                lines.append(f"{posted_at} [{score:+d}]({link}) in <#{record.channel_id}>")
+            else:
+                lines.append(f"{posted_at} {score:+d} in a channel the bot can't see")
+        embed.description = "\n".join(lines) or "No karma messages yet."
+        embed.set_footer(text=f"Page {self.page}")
+        return embed
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:  # type: ignore
+        if interaction.user.id != self.owner_id:
+            await interaction.response.send_message("Only who ran the command can change pages.", ephemeral=True)
+            return False
+        return True
+
+    async def on_timeout(self) -> None:
+        if self.message is not None:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
+
+    @discord.ui.button(label="Newer", emoji="\N{BLACK LEFT-POINTING TRIANGLE}")
+    async def newer(self, interaction: discord.Interaction, button: discord.ui.Button) -> None:
+        await self.load(after=self.records[0].message_id)
+        self.page -= 1
+        await interaction.response.edit_message(embed=self.embed(), view=self)
+
+    @discord.ui.button(label="Older", emoji="\N{BLACK RIGHT-POINTING TRIANGLE}")
+    async def older(self, interaction: discord.Interaction, button: discord.ui.Button) -> None:
+        await self.load(before=self.records[-1].message_id)
+        self.page += 1
+        await interaction.response.edit_message(embed=self.embed(), view=self)
+
 
 class Karma(commands.Cog):
     def __init__(self, bot: "MitBot") -> None:
         self.bot = bot
+        self._export_lock = asyncio.Lock()
 
     async def cog_load(self) -> None:
         logger.info("Loading Karma cog")
@@ -28,18 +123,90 @@ class Karma(commands.Cog):
             user = member
 
         logger.info(f"Retrieving karma for user {user.name}")
-        messages = await self.bot.prisma.karmamessage.find_many(
-            where={
-                "author_id": user.id,
-            },
-        )
-        sum_karma = sum([message.upvotes - message.downvotes for message in messages])
+        sum_karma = await self.bot.db.get_karma(user.id)
 
         await interaction.response.send_message(
             f"{user.mention} tem {sum_karma} de karma.",
             allowed_mentions=discord.AllowedMentions.none(),  # avoid ping the user
         )
 
+    @app_commands.command(name="karma-history")
+    async def karma_history(self, interaction: discord.Interaction, member: discord.Member | None = None) -> None:
+        """Browse the messages that earned karma to a user."""
+        user = member or interaction.user
+        view = KarmaHistoryView(self.bot, interaction.user.id, user)
+        await view.load()
+        if view.newer.disabled and view.older.disabled:
+            await interaction.response.send_message(
+                embed=view.embed(), allowed_mentions=discord.AllowedMentions.none()
+            )
+            return
+
+        await interaction.response.send_message(
+            embed=view.embed(), view=view, allowed_mentions=discord.AllowedMentions.none()
+        )
+        view.message = await interaction.original_response()
+
+    @app_commands.command(name="karma-export")
+    @app_commands.guild_only()
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.rename(file_format="format")
+    @app_commands.describe(file_format="CSV with a header row, or one JSON object per line")
+    @app_commands.choices(
+        file_format=[
+            app_commands.Choice(name="CSV", value="csv"),
+            app_commands.Choice(name="NDJSON", value="ndjson"),
+        ]
+    )
+    async def karma_export(self, interaction: discord.Interaction, file_format: str = "csv") -> None:
+        """Export the karma messages of this guild as a gzip compressed file."""
+        assert interaction.guild is not None
+        guild = interaction.guild
+        if self._export_lock.locked():
+            await interaction.response.send_message("An export is already running, try again later.", ephemeral=True)
+            return
+        guild_settings = self.bot.settings.guilds.get(guild.id)
+        channel_ids = set(guild_settings.karma_channels_ids) if guild_settings is not None else set()
+
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        loop = asyncio.get_running_loop()
+        fd, path = tempfile.mkstemp(prefix="karma-", suffix=f".{file_format}.gz")
+        os.close(fd)
+        try:
+            async with self._export_lock:
+                # The table is scanned by message id a chunk at a time and each chunk is written out before
+                # the next one is read, so memory use doesn't grow with the table
+                exported = 0
+                with gzip.open(path, "wt", encoding="utf-8", newline="") as file:
+                    if file_format == "csv":
+                        await loop.run_in_executor(None, write_rows, file, [KarmaRecord._fields], file_format)
+                    after = None
+                    while chunk := await self.bot.db.get_karma_chunk(after, EXPORT_CHUNK_SIZE):
+                        after = chunk[-1].message_id
+                        rows = [row for row in chunk if row.channel_id in channel_ids]
+                        if rows:
+                            await loop.run_in_executor(None, write_rows, file, rows, file_format)
+                            exported += len(rows)
+                        if len(chunk) < EXPORT_CHUNK_SIZE:
+                            break
+
+            size = os.path.getsize(path)
+            logger.info(f"Exported {exported} karma messages of guild {guild.name} as {file_format} ({size} bytes)")
+            if size > guild.filesize_limit:
+                await interaction.followup.send(
+                    f"The export of {exported} messages is {size / 1024 / 1024:.1f} MiB, "
+                    f"over the upload limit of this guild.",
+                    ephemeral=True,
+                )
+                return
+            await interaction.followup.send(
+                f"Exported {exported} karma messages.",
+                file=discord.File(path, filename=f"karma-{guild.id}.{file_format}.gz"),
+                ephemeral=True,
+            )
+        finally:
+            os.remove(path)
+
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message) -> None:
         if message.guild is None:
@@ -56,16 +223,14 @@ class Karma(commands.Cog):
             f"Adding karma reactions to message {message.id!r} by {message.author.name} on channel #{message.channel}"
         )
 
-        await message.add_reaction(self.bot.settings.emojis.upvote)
-        await message.add_reaction(self.bot.settings.emojis.downvote)
+        # Stored before reacting: votes cast while the reactions are deferred still need the message
+        await self.bot.db.create_karma_message(message.id, message.author.id, message.channel.id)
 
-        await self.bot.prisma.karmamessage.create(
-            data={
-                "message_id": message.id,
-                "author_id": message.author.id,
-                "channel_id": message.channel.id,
-            }
-        )
+        # Nobody waits on these reactions, a burst of posts shouldn't delay replies or join logs.
+        # A reservation covers a single request, so each reaction waits for its own
+        for emoji in (self.bot.settings.emojis.upvote, self.bot.settings.emojis.downvote):
+            async with self.bot.ratelimits.priority(Priority.NORMAL):
+                await message.add_reaction(emoji)
 
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload: RawReactionActionEvent):
@@ -80,31 +245,15 @@ class Karma(commands.Cog):
             return
 
         if payload.emoji == self.bot.settings.emojis.upvote:
-            karma_message = await self.bot.prisma.karmamessage.update_many(
-                where={
-                    "message_id": payload.message_id,
-                    "author_id": {"not": payload.user_id},
-                },
-                data={
-                    "upvotes": {"increment": 1},
-                },
-            )
-            if karma_message > 0:
+            voted = await self.bot.db.add_karma_vote(payload.message_id, payload.user_id, upvotes=1)
+            if voted:
                 logger.info(f"User {payload.member.name} upvoted message id {payload.message_id!r}")
             else:
                 logger.info(f"User {payload.member.name} tried to upvote his own message id {payload.message_id!r}")
 
         elif payload.emoji == self.bot.settings.emojis.downvote:
-            karma_message = await self.bot.prisma.karmamessage.update_many(
-                where={
-                    "message_id": payload.message_id,
-                    "author_id": {"not": payload.user_id},
-                },
-                data={
-                    "downvotes": {"increment": 1},
-                },
-            )
-            if karma_message > 0:
+            voted = await self.bot.db.add_karma_vote(payload.message_id, payload.user_id, downvotes=1)
+            if voted:
                 logger.info(f"User {payload.member.name} downvoted message id {payload.message_id!r}")
             else:
                 logger.info(f"User {payload.member.name} tried to downvote his own message id {payload.message_id!r}")
@@ -120,16 +269,8 @@ class Karma(commands.Cog):
         # To check if the user is bot, we need to get the member object. Won't be doing that here for now.
 
         if payload.emoji == self.bot.settings.emojis.upvote:
-            karma_message = await self.bot.prisma.karmamessage.update_many(
-                where={
-                    "message_id": payload.message_id,
-                    "author_id": {"not": payload.user_id},
-                },
-                data={
-                    "upvotes": {"decrement": 1},
-                },
-            )
-            if karma_message > 0:
+            voted = await self.bot.db.add_karma_vote(payload.message_id, payload.user_id, upvotes=-1)
+            if voted:
                 logger.info(f"User id {payload.user_id!r} removed upvote from message id {payload.message_id!r}")
             else:
                 logger.info(
@@ -137,16 +278,8 @@ class Karma(commands.Cog):
                 )
 
         elif payload.emoji == self.bot.settings.emojis.downvote:
-            karma_message = await self.bot.prisma.karmamessage.update_many(
-                where={
-                    "message_id": payload.message_id,
-                    "author_id": {"not": payload.user_id},
-                },
-                data={
-                    "downvotes": {"decrement": 1},
-                },
-            )
-            if karma_message > 0:
+            voted = await self.bot.db.add_karma_vote(payload.message_id, payload.user_id, downvotes=-1)
+            if voted:
                 logger.info(f"User id {payload.user_id!r} removed downvote from message id {payload.message_id!r}")
             else:
                 logger.info(
@@ -5,6 +5,8 @@ from typing import TYPE_CHECKING
 import discord
 from loguru import logger
 
+from core.ratelimit import Priority
+
 if TYPE_CHECKING:
     from src.main import MitBot
 
@@ -89,8 +91,13 @@ class Mover(commands.Cog):
             ephemeral=True,
         )
 
+        async def move(member: discord.Member) -> None:
+            # A mass move can take a while, it leaves room in the global budget for higher priority requests
+            async with self.bot.ratelimits.priority(Priority.NORMAL):
+                await member.move_to(to_channel)
+
         total_members = len(from_channel.members)
-        futures = [member.move_to(to_channel) for member in from_channel.members]
+        futures = [move(member) for member in from_channel.members]
         results = await asyncio.gather(*futures, return_exceptions=True)
 
         moved_members = results.count(None)
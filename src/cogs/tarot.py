@@ -10,10 +10,11 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 from loguru import logger
-from PIL import Image
 from typing import TYPE_CHECKING, TypedDict
 
 if TYPE_CHECKING:
+    from PIL import Image
+
     from src.main import MitBot
 
 
@@ -21,7 +22,8 @@ class Cartas(commands.Cog):
 
     def __init__(self, bot: "MitBot"):
         self.bot = bot
-        self.executor = ThreadPoolExecutor(max_workers=1)
+        # Named so the profiler of the debug cog can find its thread
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tarot")
         self.loop = asyncio.get_event_loop()
 
     async def cog_load(self) -> None:
@@ -32,6 +34,9 @@ class Cartas(commands.Cog):
         logger.info("Unloading Tarot cog")
 
     def load_cards(self):
+        # PIL is imported here, in the executor, so it doesn't slow down loading the cog
+        from PIL import Image
+
         Card = TypedDict("Card", {"name": str, "image": Image.Image})
         self.cards: list[Card] = []
         for card_file in glob.glob("./cards/*.png"):
@@ -45,6 +50,8 @@ class Cartas(commands.Cog):
     )
     @app_commands.describe(cartas="número de cartas a serem tiradas")
     async def tarot(self, interaction: discord.Interaction, cartas: Literal[1, 2, 3, 4, 5] = 3):
+        from PIL import Image  # already imported by load_cards
+
         def concat_images(im_list: list[Image.Image]):
             min_height = min(im.height for im in im_list)
             im_list_resize = [im.resize((int(im.width * min_height / im.height), min_height)) for im in im_list]
@@ -0,0 +1,190 @@
+import asyncio
+import itertools
+import json
+from typing import TYPE_CHECKING, Any, Awaitable, Callable
+
+from loguru import logger
+
+from core.tasks import cancel_tasks, create_background_task
+
+if TYPE_CHECKING:
+    from core.settings import ClusterSettings
+    from src.main import MitBot
+
+# Messages are JSON objects, one per line:
+#   {"op": "hello", "cluster": 0, "shards": [0, 1]}             cluster -> launcher
+#   {"op": "health", "cluster": 0, ...}                          cluster -> launcher
+#   {"op": "command", "id": 1, "name": "...", "args": {...}}     both ways
+#   {"op": "reply", "id": 1, "result": ...}                      both ways
+# A command sent to the launcher is either answered by it ("status") or forwarded to every cluster,
+# in which case the reply result maps each cluster id to its own result.
+
+CommandHandler = Callable[[dict[str, Any]], Awaitable[Any]]
+
+RECONNECT_DELAY = 5.0
+
+
+def split_shards(shard_count: int, clusters: int) -> list[list[int]]:
+    """Splits ``range(shard_count)`` into ``clusters`` contiguous and balanced groups."""
+    clusters = max(1, min(clusters, shard_count))
+    size, extra = divmod(shard_count, clusters)
+    groups = []
+    start = 0
+    for index in range(clusters):
+        end = start + size + (1 if index < extra else 0)
+        groups.append(list(range(start, end)))
+        start = end
+    return groups
+
+
+async def read_message(reader: asyncio.StreamReader) -> dict[str, Any] | None:
+    line = await reader.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+async def write_message(writer: asyncio.StreamWriter, message: dict[str, Any]) -> None:
+    writer.write(json.dumps(message, separators=(",", ":")).encode() + b"\n")
+    await writer.drain()
+
+
+class ClusterClient:
+    """Connection of a cluster process to the launcher's IPC channel.
+
+    Sends a health report every ``health_interval`` seconds and runs the commands other clusters
+    broadcast through the launcher. Reconnects on its own if the launcher goes away.
+    """
+
+    def __init__(self, bot: "MitBot", settings: "ClusterSettings") -> None:
+        self.bot = bot
+        self.settings = settings
+        self.handlers: dict[str, CommandHandler] = {"reload_extension": self._reload_extension}
+        self._ids = itertools.count(1)
+        self._pending: dict[int, asyncio.Future[Any]] = {}
+        self._writer: asyncio.StreamWriter | None = None
+        self._task: asyncio.Task | None = None
+        self._command_tasks: set[asyncio.Task] = set()
+
+    def add_handler(self, name: str, handler: CommandHandler) -> None:
+        self.handlers[name] = handler
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="mitbot: cluster ipc")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await cancel_tasks(self._command_tasks)
+
+    async def request(self, name: str, timeout: float = 10.0, **args: Any) -> Any:
+        """Sends a command through the launcher and waits for its reply."""
+        if self._writer is None:
+            raise ConnectionError("Not connected to the cluster launcher")
+        message_id = next(self._ids)
+        future: asyncio.Future[Any] = asyncio.get_running_loop().create_future()
+        self._pending[message_id] = future
+        try:
+            await write_message(self._writer, {"op": "command", "id": message_id, "name": name, "args": args})
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(message_id, None)
+
+    def health(self) -> dict[str, Any]:
+        shards = getattr(self.bot, "shards", {})
+        return {
+            "op": "health",
+            "cluster": self.settings.cluster_id,
+            "ready": self.bot.is_ready(),
+            "guilds": len(self.bot.guilds),
+            "shard_health": {
+                str(shard_id): {"latency": shard.latency, "closed": shard.is_closed()}
+                for shard_id, shard in shards.items()
+            },
+        }
+
+    async def _run(self) -> None:
+        address = f"{self.settings.ipc_host}:{self.settings.ipc_port}"
+        warned = False
+        while True:
+            try:
+                reader, self._writer = await asyncio.open_connection(self.settings.ipc_host, self.settings.ipc_port)
+            except OSError:
+                # Most likely the bot was started with cluster mode on but without the launcher, say it once
+                if not warned:
+                    logger.warning(f"Cluster launcher unreachable at {address}, retrying in the background")
+                    warned = True
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+
+            warned = False
+            logger.debug(f"Cluster {self.settings.cluster_id} connected to the launcher")
+            # Kept with the command tasks so close() cancels it and a failed write is logged
+            health_task = create_background_task(
+                self._command_tasks, self._report_health(), name="mitbot: cluster health"
+            )
+            try:
+                await write_message(
+                    self._writer,
+                    {"op": "hello", "cluster": self.settings.cluster_id, "shards": self.settings.shard_ids},
+                )
+                while True:
+                    try:
+                        message = await read_message(reader)
+                    except json.JSONDecodeError:
+                        logger.warning("Ignoring a malformed cluster IPC message")
+                        continue
+                    if message is None:
+                        break
+                    # A bad message must not end the connection
+                    try:
+                        await self._handle(message)
+                    except Exception:
+                        logger.exception(f"Error while handling cluster IPC message {message!r}")
+            except OSError:
+                logger.exception("Cluster IPC connection failed")
+            finally:
+                health_task.cancel()
+                self._writer.close()
+                self._writer = None
+                for future in self._pending.values():
+                    if not future.done():
+                        future.set_exception(ConnectionError("Lost the connection to the cluster launcher"))
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _report_health(self) -> None:
+        while self._writer is not None:
+            await write_message(self._writer, self.health())
+            await asyncio.sleep(self.settings.health_interval)
+
+    async def _handle(self, message: dict[str, Any]) -> None:
+        if message["op"] == "reply":
+            future = self._pending.get(message["id"])
+            if future is not None and not future.done():
+                future.set_result(message.get("result"))
+        elif message["op"] == "command":
+            create_background_task(
+                self._command_tasks, self._run_command(message), name=f"mitbot: cluster command {message['name']}"
+            )
+
+    async def _run_command(self, message: dict[str, Any]) -> None:
+        handler = self.handlers.get(message["name"])
+        if handler is None:
+            result: Any = {"error": f"unknown command {message['name']}"}
+        else:
+            try:
+                result = await handler(message.get("args", {}))
+            except Exception as error:
+                logger.exception(f"Error while running cluster command {message['name']}")
+                result = {"error": str(error)}
+        if self._writer is not None:
+            await write_message(self._writer, {"op": "reply", "id": message["id"], "result": result})
+
+    async def _reload_extension(self, args: dict[str, Any]) -> Any:
+        await self.bot.reload_extension(args["name"])
+        return "ok"
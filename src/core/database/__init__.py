@@ -0,0 +1,30 @@
+from typing import TYPE_CHECKING
+
+from core.database.base import ALL_TIME, QUERY_MODELS, KarmaRecord, Repository, month_key
+
+if TYPE_CHECKING:
+    from core.settings import DatabaseSettings
+
+__all__ = ("ALL_TIME", "QUERY_MODELS", "KarmaRecord", "Repository", "create_repository", "month_key")
+
+
+def create_repository(settings: "DatabaseSettings") -> Repository:
+    """Builds the repository for the configured backend.
+
+    Drivers are imported here so a deploy only needs the one it uses.
+    """
+    if settings.backend == "sqlite":
+        from core.database.sqlite import SQLiteRepository
+
+        return SQLiteRepository(settings.sqlite_path)
+
+    if settings.backend == "postgres":
+        from core.database.postgres import PostgresRepository
+
+        if settings.postgres_dsn is None:
+            raise ValueError("database.postgres_dsn is required by the postgres backend")
+        return PostgresRepository(settings.postgres_dsn, settings.pool_min_size, settings.pool_max_size)
+
+    from core.database.prisma_repository import PrismaRepository
+
+    return PrismaRepository()
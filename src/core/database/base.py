@@ -0,0 +1,95 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import NamedTuple
+
+# Table each query touches, used to label database metrics
+QUERY_MODELS = {
+    "create_karma_message": "karma_messages",
+    "add_karma_vote": "karma_messages",
+    "get_karma": "karma_messages",
+    "get_karma_history": "karma_messages",
+    "get_karma_chunk": "karma_messages",
+    "create_invite": "invites",
+    "pop_invite": "invites",
+    "record_join": "join_events",
+    "get_top_inviters": "inviter_stats",
+    "get_inviter_joins": "inviter_stats",
+}
+
+# Month of the inviter_stats rows holding the all time totals
+ALL_TIME = 0
+
+
+def month_key(moment: datetime) -> int:
+    """Returns the inviter_stats month of ``moment``, e.g. 202410 for October 2024."""
+    return moment.year * 100 + moment.month
+
+
+class KarmaRecord(NamedTuple):
+    message_id: int
+    author_id: int
+    channel_id: int
+    upvotes: int
+    downvotes: int
+
+
+class Repository(ABC):
+    """Data access for the cogs. Each backend implements these queries on top of its own driver."""
+
+    @abstractmethod
+    async def connect(self) -> None:
+        ...
+
+    @abstractmethod
+    async def close(self) -> None:
+        ...
+
+    @abstractmethod
+    async def create_karma_message(self, message_id: int, author_id: int, channel_id: int) -> None:
+        """Starts tracking the karma of a message."""
+
+    @abstractmethod
+    async def add_karma_vote(self, message_id: int, voter_id: int, upvotes: int = 0, downvotes: int = 0) -> bool:
+        """Adds (or removes, when negative) votes to a tracked message.
+
+        Votes from the author of the message are ignored. Returns whether the message was updated.
+        """
+
+    @abstractmethod
+    async def get_karma(self, author_id: int) -> int:
+        """Returns the sum of upvotes minus downvotes of every message by ``author_id``."""
+
+    @abstractmethod
+    async def get_karma_history(
+        self, author_id: int, limit: int, before: int | None = None, after: int | None = None
+    ) -> list[KarmaRecord]:
+        """Returns a page of the messages of ``author_id``, newest first.
+
+        The page holds the ``limit`` messages right before the message id ``before``, or right after
+        the message id ``after``, or the newest ones when neither is given. Pages are keyset paginated
+        on ``(author_id, message_id)``, so every page costs the same however deep it is.
+        """
+
+    @abstractmethod
+    async def get_karma_chunk(self, after: int | None, limit: int) -> list[KarmaRecord]:
+        """Returns up to ``limit`` messages with an id greater than ``after``, by id, to scan the whole table."""
+
+    @abstractmethod
+    async def create_invite(self, code: str, inviter_id: int) -> None:
+        """Stores who asked the bot to create the invite ``code``."""
+
+    @abstractmethod
+    async def pop_invite(self, code: str) -> int | None:
+        """Deletes the invite ``code`` and returns its inviter id, or None if it isn't stored."""
+
+    @abstractmethod
+    async def record_join(self, guild_id: int, member_id: int, inviter_id: int | None, joined_at: datetime) -> None:
+        """Stores a member join and, when the inviter is known, adds it to the inviter monthly and all time stats."""
+
+    @abstractmethod
+    async def get_top_inviters(self, guild_id: int, month: int, limit: int = 10) -> list[tuple[int, int]]:
+        """Returns up to ``limit`` ``(inviter id, joins)`` pairs of ``month`` (or ``ALL_TIME``), most joins first."""
+
+    @abstractmethod
+    async def get_inviter_joins(self, guild_id: int, inviter_id: int, month: int) -> int:
+        """Returns how many joins ``inviter_id`` brought in ``month`` (or ``ALL_TIME``)."""
@@ -0,0 +1,183 @@
+from datetime import datetime
+
+import asyncpg
+from loguru import logger
+
+from core.database.base import ALL_TIME, KarmaRecord, Repository, month_key
+
+# Kept in sync with postgres/schema.sql
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS karma_messages
+(
+    message_id bigint NOT NULL CONSTRAINT karma_messages_pk PRIMARY KEY,
+    author_id bigint NOT NULL,
+    upvotes integer DEFAULT 0 NOT NULL,
+    downvotes integer DEFAULT 0 NOT NULL,
+    channel_id bigint NOT NULL
+);
+DROP INDEX IF EXISTS karma_messages_author_index;
+CREATE INDEX IF NOT EXISTS karma_messages_author_message_index ON karma_messages (author_id, message_id);
+CREATE TABLE IF NOT EXISTS invites
+(
+    code text NOT NULL CONSTRAINT invites_pk PRIMARY KEY,
+    inviter_id bigint NOT NULL
+);
+CREATE TABLE IF NOT EXISTS join_events
+(
+    id bigserial NOT NULL CONSTRAINT join_events_pk PRIMARY KEY,
+    guild_id bigint NOT NULL,
+    member_id bigint NOT NULL,
+    inviter_id bigint,
+    joined_at bigint NOT NULL
+);
+CREATE INDEX IF NOT EXISTS join_events_inviter_index ON join_events (inviter_id, joined_at);
+CREATE TABLE IF NOT EXISTS inviter_stats
+(
+    guild_id bigint NOT NULL,
+    inviter_id bigint NOT NULL,
+    month integer NOT NULL,
+    joins integer DEFAULT 0 NOT NULL,
+    CONSTRAINT inviter_stats_pk PRIMARY KEY (guild_id, inviter_id, month)
+);
+CREATE INDEX IF NOT EXISTS inviter_stats_ranking_index ON inviter_stats (guild_id, month, joins);
+"""
+
+
+KARMA_COLUMNS = "message_id, author_id, channel_id, upvotes, downvotes"
+
+
+class PostgresRepository(Repository):
+    """Backend talking to PostgreSQL directly through an asyncpg connection pool.
+
+    asyncpg prepares and caches every statement per connection, so repeated queries skip parsing
+    and planning.
+    """
+
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10) -> None:
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.pool: asyncpg.Pool | None = None
+
+    @property
+    def _pool(self) -> asyncpg.Pool:
+        if self.pool is None:
+            raise RuntimeError("PostgreSQL repository is not connected")
+        return self.pool
+
+    async def connect(self) -> None:
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=self.min_size, max_size=self.max_size)
+        async with self.pool.acquire() as connection:
+            await connection.execute(SCHEMA)
+        logger.debug(f"Connected to PostgreSQL (pool size {self.min_size}-{self.max_size})")
+
+    async def close(self) -> None:
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def create_karma_message(self, message_id: int, author_id: int, channel_id: int) -> None:
+        await self._pool.execute(
+            "INSERT INTO karma_messages (message_id, author_id, channel_id) VALUES ($1, $2, $3)",
+            message_id,
+            author_id,
+            channel_id,
+        )
+
+    async def add_karma_vote(self, message_id: int, voter_id: int, upvotes: int = 0, downvotes: int = 0) -> bool:
+        status = await self._pool.execute(
+            "UPDATE karma_messages SET upvotes = upvotes + $1, downvotes = downvotes + $2 "
+            "WHERE message_id = $3 AND author_id <> $4",
+            upvotes,
+            downvotes,
+            message_id,
+            voter_id,
+        )
+        return status != "UPDATE 0"
+
+    async def get_karma(self, author_id: int) -> int:
+        karma = await self._pool.fetchval(
+            "SELECT COALESCE(SUM(upvotes - downvotes), 0) FROM karma_messages WHERE author_id = $1",
+            author_id,
+        )
+        return int(karma)
+
+    async def get_karma_history(
+        self, author_id: int, limit: int, before: int | None = None, after: int | None = None
+    ) -> list[KarmaRecord]:
+        if before is not None:
+            rows = await self._pool.fetch(
+                f"SELECT {KARMA_COLUMNS} FROM karma_messages WHERE author_id = $1 AND message_id < $2 "
+                "ORDER BY message_id DESC LIMIT $3",
+                author_id,
+                before,
+                limit,
+            )
+        elif after is not None:
+            rows = await self._pool.fetch(
+                f"SELECT {KARMA_COLUMNS} FROM karma_messages WHERE author_id = $1 AND message_id > $2 "
+                "ORDER BY message_id ASC LIMIT $3",
+                author_id,
+                after,
+                limit,
+            )
+            rows.reverse()
+        else:
+            rows = await self._pool.fetch(
+                f"SELECT {KARMA_COLUMNS} FROM karma_messages WHERE author_id = $1 ORDER BY message_id DESC LIMIT $2",
+                author_id,
+                limit,
+            )
+        return [KarmaRecord(*row) for row in rows]
+
+    async def get_karma_chunk(self, after: int | None, limit: int) -> list[KarmaRecord]:
+        rows = await self._pool.fetch(
+            f"SELECT {KARMA_COLUMNS} FROM karma_messages WHERE message_id > $1 ORDER BY message_id LIMIT $2",
+            after if after is not None else -1,
+            limit,
+        )
+        return [KarmaRecord(*row) for row in rows]
+
+    async def create_invite(self, code: str, inviter_id: int) -> None:
+        await self._pool.execute("INSERT INTO invites (code, inviter_id) VALUES ($1, $2)", code, inviter_id)
+
+    async def pop_invite(self, code: str) -> int | None:
+        return await self._pool.fetchval("DELETE FROM invites WHERE code = $1 RETURNING inviter_id", code)
+
+    async def record_join(self, guild_id: int, member_id: int, inviter_id: int | None, joined_at: datetime) -> None:
+        async with self._pool.acquire() as connection, connection.transaction():
+            await connection.execute(
+                "INSERT INTO join_events (guild_id, member_id, inviter_id, joined_at) VALUES ($1, $2, $3, $4)",
+                guild_id,
+                member_id,
+                inviter_id,
+                int(joined_at.timestamp()),
+            )
+            if inviter_id is not None:
+                await connection.execute(
+                    "INSERT INTO inviter_stats (guild_id, inviter_id, month, joins) VALUES ($1, $2, $3, 1), ($1, $2, $4, 1) "
+                    "ON CONFLICT (guild_id, inviter_id, month) DO UPDATE SET joins = inviter_stats.joins + 1",
+                    guild_id,
+                    inviter_id,
+                    month_key(joined_at),
+                    ALL_TIME,
+                )
+
+    async def get_top_inviters(self, guild_id: int, month: int, limit: int = 10) -> list[tuple[int, int]]:
+        rows = await self._pool.fetch(
+            "SELECT inviter_id, joins FROM inviter_stats WHERE guild_id = $1 AND month = $2 "
+            "ORDER BY joins DESC LIMIT $3",
+            guild_id,
+            month,
+            limit,
+        )
+        return [(row["inviter_id"], row["joins"]) for row in rows]
+
+    async def get_inviter_joins(self, guild_id: int, inviter_id: int, month: int) -> int:
+        joins = await self._pool.fetchval(
+            "SELECT joins FROM inviter_stats WHERE guild_id = $1 AND inviter_id = $2 AND month = $3",
+            guild_id,
+            inviter_id,
+            month,
+        )
+        return joins or 0
@@ -0,0 +1,168 @@
+from datetime import datetime
+
+import prisma
+
+from core.database.base import ALL_TIME, KarmaRecord, Repository, month_key
+
+
+class PrismaRepository(Repository):
+    """Backend going through the Prisma client and its query engine process.
+
+    The karma total is summed by the database with ``group_by``, and the history pages and export
+    chunks are keyset queries (a ``message_id`` bound, ordered by ``message_id``, ``take`` rows), so
+    none of them loads more than the rows it returns.
+    """
+
+    def __init__(self, url: str | None = None) -> None:
+        # url overrides the datasource of prisma/schema.prisma
+        self.client = prisma.Prisma(datasource={"url": url} if url is not None else None)
+
+    async def connect(self) -> None:
+        await self.client.connect()
+
+    async def close(self) -> None:
+        if self.client.is_connected():
+            await self.client.disconnect()
+
+    async def create_karma_message(self, message_id: int, author_id: int, channel_id: int) -> None:
+        await self.client.karmamessage.create(
+            data={
+                "message_id": message_id,
+                "author_id": author_id,
+                "channel_id": channel_id,
+            }
+        )
+
+    async def add_karma_vote(self, message_id: int, voter_id: int, upvotes: int = 0, downvotes: int = 0) -> bool:
+        updated = await self.client.karmamessage.update_many(
+            where={
+                "message_id": message_id,
+                "author_id": {"not": voter_id},
+            },
+            data={
+                "upvotes": {"increment": upvotes},
+                "downvotes": {"increment": downvotes},
+            },
+        )
+        return updated > 0
+
+    async def get_karma(self, author_id: int) -> int:
+        groups = await self.client.karmamessage.group_by(
+            ["author_id"],
+            where={
+                "author_id": author_id,
+            },
+            sum={
+                "upvotes": True,
+                "downvotes": True,
+            },
+        )
+        if not groups:
+            return 0
+        total = groups[0].get("_sum") or {}
+        return (total.get("upvotes") or 0) - (total.get("downvotes") or 0)
+
+    async def get_karma_history(
+        self, author_id: int, limit: int, before: int | None = None, after: int | None = None
+    ) -> list[KarmaRecord]:
+        where: dict = {"author_id": author_id}
+        order = "desc"
+        if before is not None:
+            where["message_id"] = {"lt": before}
+        elif after is not None:
+            where["message_id"] = {"gt": after}
+            order = "asc"
+        messages = await self.client.karmamessage.find_many(
+            where=where,  # type: ignore
+            order={"message_id": order},
+            take=limit,
+        )
+        records = [
+            KarmaRecord(message.message_id, message.author_id, message.channel_id, message.upvotes, message.downvotes)
+            for message in messages
+        ]
+        if order == "asc":
+            records.reverse()
+        return records
+
+    async def get_karma_chunk(self, after: int | None, limit: int) -> list[KarmaRecord]:
+        messages = await self.client.karmamessage.find_many(
+            where={"message_id": {"gt": after if after is not None else -1}},
+            order={"message_id": "asc"},
+            take=limit,
+        )
+        return [
+            KarmaRecord(message.message_id, message.author_id, message.channel_id, message.upvotes, message.downvotes)
+            for message in messages
+        ]
+
+    async def create_invite(self, code: str, inviter_id: int) -> None:
+        await self.client.invite.create(
+            data={
+                "code": code,
+                "inviter_id": inviter_id,
+            }
+        )
+
+    async def pop_invite(self, code: str) -> int | None:
+        invite = await self.client.invite.delete(where={"code": code})
+        if invite is None:
+            return None
+        return invite.inviter_id
+
+    async def record_join(self, guild_id: int, member_id: int, inviter_id: int | None, joined_at: datetime) -> None:
+        async with self.client.tx() as transaction:
+            await transaction.joinevent.create(
+                data={
+                    "guild_id": guild_id,
+                    "member_id": member_id,
+                    "inviter_id": inviter_id,
+                    "joined_at": int(joined_at.timestamp()),
+                }
+            )
+            if inviter_id is None:
+                return
+            for month in (month_key(joined_at), ALL_TIME):
+                await transaction.inviterstats.upsert(
+                    where={
+                        "guild_id_inviter_id_month": {
+                            "guild_id": guild_id,
+                            "inviter_id": inviter_id,
+                            "month": month,
+                        }
+                    },
+                    data={
+                        "create": {
+                            "guild_id": guild_id,
+                            "inviter_id": inviter_id,
+                            "month": month,
+                            "joins": 1,
+                        },
+                        "update": {
+                            "joins": {"increment": 1},
+                        },
+                    },
+                )
+
+    async def get_top_inviters(self, guild_id: int, month: int, limit: int = 10) -> list[tuple[int, int]]:
+        stats = await self.client.inviterstats.find_many(
+            where={
+                "guild_id": guild_id,
+                "month": month,
+            },
+            order={"joins": "desc"},
+            take=limit,
+        )
+        return [(stat.inviter_id, stat.joins) for stat in stats]
+
+    async def get_inviter_joins(self, guild_id: int, inviter_id: int, month: int) -> int:
+        stat = await self.client.inviterstats.find_unique(
+            where={
+                "guild_id_inviter_id_month": {
+                    "guild_id": guild_id,
+                    "inviter_id": inviter_id,
+                    "month": month,
+                }
+            },
+        )
+        return stat.joins if stat is not None else 0
@@ -0,0 +1,205 @@
+import asyncio
+from datetime import datetime
+
+import aiosqlite
+from loguru import logger
+
+from core.database.base import ALL_TIME, KarmaRecord, Repository, month_key
+
+# Same tables `prisma db push` creates, so both backends can share a database file
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS "karma_messages" (
+    "message_id" BIGINT NOT NULL PRIMARY KEY,
+    "author_id" BIGINT NOT NULL,
+    "upvotes" INTEGER NOT NULL DEFAULT 0,
+    "downvotes" INTEGER NOT NULL DEFAULT 0,
+    "channel_id" BIGINT NOT NULL
+);
+-- Replaced by the (author_id, message_id) index, which also serves the author_id lookups
+DROP INDEX IF EXISTS "karma_messages_author_id_idx";
+CREATE INDEX IF NOT EXISTS "karma_messages_author_id_message_id_idx" ON "karma_messages"("author_id", "message_id");
+CREATE TABLE IF NOT EXISTS "invites" (
+    "code" TEXT NOT NULL PRIMARY KEY,
+    "inviter_id" BIGINT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS "join_events" (
+    "id" INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    "guild_id" BIGINT NOT NULL,
+    "member_id" BIGINT NOT NULL,
+    "inviter_id" BIGINT,
+    "joined_at" BIGINT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS "join_events_inviter_id_joined_at_idx" ON "join_events"("inviter_id", "joined_at");
+CREATE TABLE IF NOT EXISTS "inviter_stats" (
+    "guild_id" BIGINT NOT NULL,
+    "inviter_id" BIGINT NOT NULL,
+    "month" INTEGER NOT NULL,
+    "joins" INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY ("guild_id", "inviter_id", "month")
+);
+CREATE INDEX IF NOT EXISTS "inviter_stats_guild_id_month_joins_idx" ON "inviter_stats"("guild_id", "month", "joins");
+"""
+
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    # Safe with WAL, only the last transactions can be lost on power failure
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+)
+
+
+KARMA_COLUMNS = "message_id, author_id, channel_id, upvotes, downvotes"
+KARMA_HISTORY_NEWEST = (
+    f"SELECT {KARMA_COLUMNS} FROM karma_messages WHERE author_id = ? ORDER BY message_id DESC LIMIT ?"
+)
+KARMA_HISTORY_BEFORE = (
+    f"SELECT {KARMA_COLUMNS} FROM karma_messages WHERE author_id = ? AND message_id < ? "
+    "ORDER BY message_id DESC LIMIT ?"
+)
+KARMA_HISTORY_AFTER = (
+    f"SELECT {KARMA_COLUMNS} FROM karma_messages WHERE author_id = ? AND message_id > ? "
+    "ORDER BY message_id ASC LIMIT ?"
+)
+KARMA_CHUNK = f"SELECT {KARMA_COLUMNS} FROM karma_messages WHERE message_id > ? ORDER BY message_id LIMIT ?"
+
+
+class SQLiteRepository(Repository):
+    """Backend talking to SQLite directly through aiosqlite.
+
+    Statements are kept as constant strings so the sqlite3 statement cache reuses the prepared
+    statements instead of compiling them on every query.
+    """
+
+    def __init__(self, path: str, cached_statements: int = 128) -> None:
+        self.path = path
+        self.cached_statements = cached_statements
+        self.connection: aiosqlite.Connection | None = None
+        # Explicit transactions get their own connection: on the shared one, BEGIN ... COMMIT would also
+        # commit or roll back whatever other statements run in between
+        self.transaction_connection: aiosqlite.Connection | None = None
+        self._transaction_lock = asyncio.Lock()
+
+    @property
+    def _conn(self) -> aiosqlite.Connection:
+        if self.connection is None:
+            raise RuntimeError("SQLite repository is not connected")
+        return self.connection
+
+    @property
+    def _transaction_conn(self) -> aiosqlite.Connection:
+        if self.transaction_connection is None:
+            raise RuntimeError("SQLite repository is not connected")
+        return self.transaction_connection
+
+    async def _open(self) -> aiosqlite.Connection:
+        # isolation_level=None: every statement is committed on its own, no implicit transactions
+        connection = await aiosqlite.connect(self.path, isolation_level=None, cached_statements=self.cached_statements)
+        for pragma in PRAGMAS:
+            await connection.execute(pragma)
+        return connection
+
+    async def connect(self) -> None:
+        self.connection = await self._open()
+        await self.connection.executescript(SCHEMA)
+        self.transaction_connection = await self._open()
+        logger.debug(f"Connected to SQLite database {self.path}")
+
+    async def close(self) -> None:
+        for connection in (self.connection, self.transaction_connection):
+            if connection is not None:
+                await connection.close()
+        self.connection = self.transaction_connection = None
+
+    async def create_karma_message(self, message_id: int, author_id: int, channel_id: int) -> None:
+        await self._conn.execute(
+            "INSERT INTO karma_messages (message_id, author_id, channel_id) VALUES (?, ?, ?)",
+            (message_id, author_id, channel_id),
+        )
+
+    async def add_karma_vote(self, message_id: int, voter_id: int, upvotes: int = 0, downvotes: int = 0) -> bool:
+        cursor = await self._conn.execute(
+            "UPDATE karma_messages SET upvotes = upvotes + ?, downvotes = downvotes + ? "
+            "WHERE message_id = ? AND author_id <> ?",
+            (upvotes, downvotes, message_id, voter_id),
+        )
+        return cursor.rowcount > 0
+
+    async def get_karma(self, author_id: int) -> int:
+        async with self._conn.execute(
+            "SELECT COALESCE(SUM(upvotes - downvotes), 0) FROM karma_messages WHERE author_id = ?",
+            (author_id,),
+        ) as cursor:
+            row = await cursor.fetchone()
+        return row[0] if row else 0
+
+    async def get_karma_history(
+        self, author_id: int, limit: int, before: int | None = None, after: int | None = None
+    ) -> list[KarmaRecord]:
+        if before is not None:
+            query, parameters = KARMA_HISTORY_BEFORE, (author_id, before, limit)
+        elif after is not None:
+            query, parameters = KARMA_HISTORY_AFTER, (author_id, after, limit)
+        else:
+            query, parameters = KARMA_HISTORY_NEWEST, (author_id, limit)
+        async with self._conn.execute(query, parameters) as cursor:
+            rows = [KarmaRecord(*row) for row in await cursor.fetchall()]
+        if after is not None and before is None:
+            rows.reverse()
+        return rows
+
+    async def get_karma_chunk(self, after: int | None, limit: int) -> list[KarmaRecord]:
+        async with self._conn.execute(KARMA_CHUNK, (after if after is not None else -1, limit)) as cursor:
+            return [KarmaRecord(*row) for row in await cursor.fetchall()]
+
+    async def create_invite(self, code: str, inviter_id: int) -> None:
+        await self._conn.execute("INSERT INTO invites (code, inviter_id) VALUES (?, ?)", (code, inviter_id))
+
+    async def pop_invite(self, code: str) -> int | None:
+        # No DELETE ... RETURNING, the SQLite shipped with the Debian image is too old for it
+        async with self._conn.execute("SELECT inviter_id FROM invites WHERE code = ?", (code,)) as cursor:
+            row = await cursor.fetchone()
+        if row is None:
+            return None
+        cursor = await self._conn.execute("DELETE FROM invites WHERE code = ?", (code,))
+        if cursor.rowcount == 0:
+            return None  # popped concurrently
+        return row[0]
+
+    async def record_join(self, guild_id: int, member_id: int, inviter_id: int | None, joined_at: datetime) -> None:
+        # The event and the stats are committed together. IMMEDIATE takes the write lock upfront, writes
+        # of the shared connection wait for the commit through busy_timeout
+        async with self._transaction_lock:
+            conn = self._transaction_conn
+            await conn.execute("BEGIN IMMEDIATE")
+            try:
+                await conn.execute(
+                    "INSERT INTO join_events (guild_id, member_id, inviter_id, joined_at) VALUES (?, ?, ?, ?)",
+                    (guild_id, member_id, inviter_id, int(joined_at.timestamp())),
+                )
+                if inviter_id is not None:
+                    await conn.execute(
+                        "INSERT INTO inviter_stats (guild_id, inviter_id, month, joins) VALUES (?, ?, ?, 1), (?, ?, ?, 1) "
+                        "ON CONFLICT (guild_id, inviter_id, month) DO UPDATE SET joins = joins + 1",
+                        (guild_id, inviter_id, month_key(joined_at), guild_id, inviter_id, ALL_TIME),
+                    )
+            except BaseException:
+                await conn.execute("ROLLBACK")
+                raise
+            await conn.execute("COMMIT")
+
+    async def get_top_inviters(self, guild_id: int, month: int, limit: int = 10) -> list[tuple[int, int]]:
+        async with self._conn.execute(
+            "SELECT inviter_id, joins FROM inviter_stats WHERE guild_id = ? AND month = ? ORDER BY joins DESC LIMIT ?",
+            (guild_id, month, limit),
+        ) as cursor:
+            rows = await cursor.fetchall()
+        return [(row[0], row[1]) for row in rows]
+
+    async def get_inviter_joins(self, guild_id: int, inviter_id: int, month: int) -> int:
+        async with self._conn.execute(
+            "SELECT joins FROM inviter_stats WHERE guild_id = ? AND inviter_id = ? AND month = ?",
+            (guild_id, inviter_id, month),
+        ) as cursor:
+            row = await cursor.fetchone()
+        return row[0] if row else 0
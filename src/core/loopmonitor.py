@@ -0,0 +1,188 @@
+import asyncio
+import contextvars
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Iterator
+
+from loguru import logger
+
+from core.metrics import Counter, Histogram
+
+if TYPE_CHECKING:
+    from core.metrics import Metrics
+    from core.settings import LoopMonitorSettings
+
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+MAX_STACK_DEPTH = 40
+
+# The listener or command the current task is running, e.g. "Karma.on_message" or "/karma (Karma.karma)"
+current_handler: contextvars.ContextVar[str | None] = contextvars.ContextVar("current_handler", default=None)
+# The watchdog thread can't read the context of the running task (Task.get_context is only in Python 3.12),
+# so the handler is also recorded per task
+_task_handlers: "weakref.WeakKeyDictionary[asyncio.Task, str]" = weakref.WeakKeyDictionary()
+
+
+@dataclass
+class Stall:
+    started_at: datetime
+    duration: float
+    task: str
+    stack: str
+
+
+def set_handler(name: str) -> contextvars.Token[str | None]:
+    """Records that the current task runs the listener or command ``name``, for the stall reports."""
+    task = asyncio.current_task()
+    if task is not None:
+        _task_handlers[task] = name
+    return current_handler.set(name)
+
+
+def reset_handler(token: contextvars.Token[str | None]) -> None:
+    current_handler.reset(token)
+    task = asyncio.current_task()
+    if task is None:
+        return
+    previous = current_handler.get()
+    if previous is None:
+        _task_handlers.pop(task, None)
+    else:
+        _task_handlers[task] = previous
+
+
+@contextmanager
+def running_handler(name: str) -> Iterator[None]:
+    token = set_handler(name)
+    try:
+        yield
+    finally:
+        reset_handler(token)
+
+
+def describe_task(task: asyncio.Task | None) -> str:
+    """Returns a short description of a task, e.g. ``Karma.on_message in discord.py: on_message``.
+
+    Tasks that don't run a listener or command are described by their coroutine instead.
+    """
+    if task is None:
+        return "<no task (plain callback)>"
+    handler = _task_handlers.get(task)
+    if handler is not None:
+        return f"{handler} in {task.get_name()}"
+    coro = task.get_coro()
+    qualname = getattr(coro, "__qualname__", None)
+    return f"{task.get_name()} ({qualname})" if qualname else task.get_name()
+
+
+class LoopMonitor:
+    """Measures event loop scheduling lag and captures what was running when the loop stalled.
+
+    A heartbeat task on the loop sleeps for ``interval`` seconds and measures how late it wakes up.
+    A watchdog thread checks the heartbeat and, once it is late by more than ``threshold``, grabs
+    the stack of the loop thread while it is still blocked, together with the task being run.
+    """
+
+    def __init__(self, settings: "LoopMonitorSettings", metrics: "Metrics | None" = None) -> None:
+        self.settings = settings
+        self.stalls: deque[Stall] = deque(maxlen=settings.history)
+
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread_id: int | None = None
+        self._heartbeat_task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._last_beat = time.perf_counter()
+        self._pending: tuple[str, str] | None = None  # (task, stack) captured by the watchdog
+
+        self._lag_metric: Histogram | None = None
+        self._stalls_metric: Counter | None = None
+        if metrics is not None:
+            self._lag_metric = metrics.registry.register(
+                Histogram("mitbot_event_loop_lag_seconds", "Event loop scheduling lag.", buckets=LAG_BUCKETS)
+            )
+            self._stalls_metric = metrics.registry.register(
+                Counter("mitbot_event_loop_stalls_total", "Event loop lag above the stall threshold.")
+            )
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        self._stopped.clear()
+        self._heartbeat_task = self._loop.create_task(self._heartbeat(), name="mitbot: loop monitor")
+        self._watchdog = threading.Thread(target=self._watch, name="mitbot-loop-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.debug(
+            f"Loop monitor started (interval {self.settings.interval}s, threshold {self.settings.threshold}s)"
+        )
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat_task = None
+        self._watchdog = None
+
+    def worst(self, count: int) -> list[Stall]:
+        return sorted(self.stalls, key=lambda stall: stall.duration, reverse=True)[:count]
+
+    async def _heartbeat(self) -> None:
+        interval = self.settings.interval
+        while True:
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            now = time.perf_counter()
+            lag = max(0.0, now - expected)
+            with self._lock:
+                self._last_beat = now
+                pending, self._pending = self._pending, None
+
+            if self._lag_metric is not None:
+                self._lag_metric.observe(lag)
+            if lag < self.settings.threshold:
+                continue
+
+            if self._stalls_metric is not None:
+                self._stalls_metric.inc()
+            task, stack = pending or ("<not captured>", "")
+            self.stalls.append(
+                Stall(
+                    started_at=datetime.now(timezone.utc) - timedelta(seconds=lag),
+                    duration=lag,
+                    task=task,
+                    stack=stack,
+                )
+            )
+            logger.warning(f"Event loop stalled for {lag * 1000:.0f}ms while running {task}")
+
+    def _watch(self) -> None:
+        interval = self.settings.interval
+        threshold = self.settings.threshold
+        poll = min(interval, threshold) / 2
+        while not self._stopped.wait(poll):
+            with self._lock:
+                late = time.perf_counter() - self._last_beat - interval
+                if late < threshold or self._pending is not None:
+                    continue
+                self._pending = self._capture()
+
+    def _capture(self) -> tuple[str, str]:
+        frame = sys._current_frames().get(self._loop_thread_id)  # type: ignore
+        stack = "".join(traceback.format_stack(frame, limit=MAX_STACK_DEPTH)) if frame is not None else ""
+        try:
+            task = describe_task(asyncio.current_task(self._loop))
+        except RuntimeError:
+            task = "<unknown>"
+        return task, stack
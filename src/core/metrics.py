@@ -0,0 +1,315 @@
+import math
+import re
+import time
+from bisect import bisect_left
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, Callable, Iterable, TypeVar
+
+import aiohttp
+from aiohttp import web
+from loguru import logger
+
+from core.database import QUERY_MODELS
+
+if TYPE_CHECKING:
+    import discord
+    from core.database import Repository
+    from core.settings import MetricsSettings
+    from core.startup import StartupTimer
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+SNOWFLAKE_SEGMENT = re.compile(r"^[0-9]{15,20}$")
+INF_LABEL = 'le="+Inf"'
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value))
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric:
+    type: str = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def expose(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def items(self) -> list[tuple[dict[str, str], float]]:
+        return [(dict(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+
+    def samples(self) -> Iterable[str]:
+        for key, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        callback: Callable[[], float] | None = None,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+        self._callback = callback
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[self._key(labels)] = value
+
+    def samples(self) -> Iterable[str]:
+        if self._callback is not None:
+            yield f"{self.name} {_format_value(self._callback())}"
+            return
+        for key, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = entry
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def samples(self) -> Iterable[str]:
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            cumulative += counts[-1]
+            yield f"{self.name}_bucket{_format_labels(self.labelnames, key, INF_LABEL)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total[0])}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}"
+
+
+M = TypeVar("M", bound=Metric)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: M) -> M:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def expose(self) -> str:
+        return "\n".join(metric.expose() for metric in self._metrics.values()) + "\n"
+
+
+def route_template(path: str) -> str:
+    """Collapses the variable parts of a Discord API path so routes can be used as labels.
+
+    Snowflakes become ``{id}``, the emoji of reaction routes becomes ``{emoji}`` and
+    interaction/webhook tokens become ``{token}``.
+    """
+    segments = path.split("/")
+    for i, segment in enumerate(segments):
+        if SNOWFLAKE_SEGMENT.match(segment):
+            segments[i] = "{id}"
+        elif i > 0 and segments[i - 1] == "reactions":
+            segments[i] = "{emoji}"
+        elif len(segment) > 32:
+            segments[i] = "{token}"
+    return "/".join(segments)
+
+
+class Metrics:
+    """Holds every metric exported by the bot and the HTTP server serving them."""
+
+    def __init__(self, settings: "MetricsSettings") -> None:
+        self.settings = settings
+        self.registry = Registry()
+        self._runner: web.AppRunner | None = None
+
+        self.listener_latency = self.registry.register(
+            Histogram("mitbot_listener_latency_seconds", "Time spent running an event listener.", ["listener"])
+        )
+        self.listener_errors = self.registry.register(
+            Counter("mitbot_listener_errors_total", "Event listeners that raised an exception.", ["listener"])
+        )
+        self.app_command_latency = self.registry.register(
+            Histogram(
+                "mitbot_app_command_latency_seconds",
+                "Time spent running an application command.",
+                ["command", "status"],
+            )
+        )
+        self.db_query_latency = self.registry.register(
+            Histogram("mitbot_db_query_latency_seconds", "Database query latency.", ["model", "action"])
+        )
+        self.db_queries = self.registry.register(
+            Counter("mitbot_db_queries_total", "Database queries executed.", ["model", "action", "status"])
+        )
+        self.http_requests = self.registry.register(
+            Counter(
+                "mitbot_http_requests_total", "Requests made to the Discord HTTP API.", ["method", "route", "status"]
+            )
+        )
+        self.http_latency = self.registry.register(
+            Histogram("mitbot_http_request_latency_seconds", "Discord HTTP API request latency.", ["method", "route"])
+        )
+        self.http_ratelimited = self.registry.register(
+            Counter(
+                "mitbot_http_ratelimited_total", "Discord HTTP API responses with status 429.", ["method", "route"]
+            )
+        )
+        self.startup_phases = self.registry.register(
+            Gauge("mitbot_startup_phase_seconds", "Duration of each startup phase of the last start.", ["phase"])
+        )
+
+    def track_gateway_latency(self, bot: "discord.Client") -> None:
+        self.registry.register(
+            Gauge("mitbot_gateway_latency_seconds", "Gateway heartbeat latency.", callback=lambda: bot.latency)
+        )
+
+    def observe_app_command(self, interaction: "discord.Interaction", status: str) -> None:
+        started_at = interaction.extras.get("started_at")
+        if started_at is None or interaction.command is None:
+            return
+        self.app_command_latency.observe(
+            time.perf_counter() - started_at,
+            command=interaction.command.qualified_name,
+            status=status,
+        )
+
+    def observe_startup(self, startup: "StartupTimer") -> None:
+        for phase, duration in startup.phases.items():
+            self.startup_phases.set(duration, phase=phase)
+        self.startup_phases.set(startup.elapsed(), phase="time to ready")
+
+    def http_trace(self, trace: aiohttp.TraceConfig | None = None) -> aiohttp.TraceConfig:
+        """Adds hooks recording Discord HTTP API requests to ``trace``, or to a new trace config."""
+        trace = trace or aiohttp.TraceConfig()
+
+        async def on_request_start(
+            session: aiohttp.ClientSession, context: SimpleNamespace, params: aiohttp.TraceRequestStartParams
+        ) -> None:
+            context.started_at = time.perf_counter()
+
+        async def on_request_end(
+            session: aiohttp.ClientSession, context: SimpleNamespace, params: aiohttp.TraceRequestEndParams
+        ) -> None:
+            route = route_template(params.url.path)
+            status = params.response.status
+            self.http_requests.inc(method=params.method, route=route, status=str(status))
+            self.http_latency.observe(time.perf_counter() - context.started_at, method=params.method, route=route)
+            if status == 429:
+                self.http_ratelimited.inc(method=params.method, route=route)
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_request_end.append(on_request_end)
+        return trace
+
+    async def _handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.registry.expose(), content_type="text/plain", charset="utf-8")
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.settings.host, self.settings.port)
+        await site.start()
+        logger.info(f"Serving metrics on http://{self.settings.host}:{self.settings.port}/metrics")
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+class InstrumentedRepository:
+    """Wraps a database repository so each query is timed and counted.
+
+    Methods that are not queries (``connect``, ``close``, ...) are passed through untouched.
+    """
+
+    def __init__(self, repository: "Repository", metrics: Metrics) -> None:
+        self._repository = repository
+        self._metrics = metrics
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._repository, name)
+        model = QUERY_MODELS.get(name)
+        if model is None:
+            return attr
+
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            status = "ok"
+            start = time.perf_counter()
+            try:
+                return await attr(*args, **kwargs)
+            except Exception:
+                status = "error"
+                raise
+            finally:
+                self._metrics.db_query_latency.observe(time.perf_counter() - start, model=model, action=name)
+                self._metrics.db_queries.inc(model=model, action=name, status=status)
+
+        # Cache the wrapper so later lookups don't go through __getattr__ again
+        setattr(self, name, wrapper)
+        return wrapper
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass, field
+from types import FrameType
+from typing import Any
+
+DEFAULT_INTERVAL = 0.005
+MAX_STACK_DEPTH = 128
+# File of the frame replacing the innermost frames of stacks deeper than MAX_STACK_DEPTH
+TRUNCATED_FILE = "<truncated>"
+MEMORY_TRACE_FRAMES = 10
+
+# (file, line of the function definition, function name)
+Frame = tuple[str, int, str]
+
+
+def frame_name(frame: Frame) -> str:
+    filename, line, name = frame
+    # ";" separates the frames of collapsed stacks
+    return f"{name} ({filename}:{line})".replace(";", ":")
+
+
+@dataclass
+class Profile:
+    duration: float
+    interval: float
+    # (thread name, frames from the outermost to the innermost) -> samples
+    stacks: Counter[tuple[str, tuple[Frame, ...]]] = field(default_factory=Counter)
+    memory: str | None = None
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    def collapsed(self) -> str:
+        """Folded stacks, the input format of flamegraph.pl, inferno and speedscope."""
+        lines = [
+            ";".join((thread, *(frame_name(frame) for frame in frames))) + f" {count}"
+            for (thread, frames), count in self.stacks.most_common()
+        ]
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self) -> str:
+        """A speedscope file with one sampled profile per thread."""
+        frame_indexes: dict[Frame, int] = {}
+        profiles: dict[str, dict[str, Any]] = {}
+        for (thread, frames), count in self.stacks.items():
+            profile = profiles.setdefault(
+                thread,
+                {
+                    "type": "sampled",
+                    "name": thread,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": self.duration,
+                    "samples": [],
+                    "weights": [],
+                },
+            )
+            profile["samples"].append([frame_indexes.setdefault(frame, len(frame_indexes)) for frame in frames])
+            profile["weights"].append(count * self.interval)
+
+        return json.dumps(
+            {
+                "$schema": "https://www.speedscope.app/file-format-schema.json",
+                "name": "mitbot",
+                "exporter": "mitbot profiler",
+                "shared": {
+                    "frames": [
+                        {"name": name, "file": filename, "line": line} for (filename, line, name) in frame_indexes
+                    ]
+                },
+                "profiles": list(profiles.values()),
+            }
+        )
+
+
+class SamplingProfiler:
+    """Samples the stacks of the event loop thread and of some worker threads from a separate thread.
+
+    Nothing is installed in the profiled threads: the sampling thread reads their current frames
+    every ``interval`` seconds and only exists while a profile is being taken.
+    """
+
+    def __init__(self, thread_prefixes: tuple[str, ...] = (), interval: float = DEFAULT_INTERVAL) -> None:
+        self.thread_prefixes = thread_prefixes
+        self.interval = interval
+        self._lock = asyncio.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    async def profile(self, duration: float, trace_memory: bool = False, memory_top: int = 25) -> Profile:
+        """Samples for ``duration`` seconds. With ``trace_memory``, also reports the top allocations meanwhile."""
+        async with self._lock:
+            profile = Profile(duration, self.interval)
+            stop = threading.Event()
+            sampler = threading.Thread(
+                target=self._sample,
+                args=(threading.get_ident(), profile, stop),
+                name="mitbot-profiler",
+                daemon=True,
+            )
+
+            # Don't stop tracemalloc if someone else started it
+            started_tracing = trace_memory and not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start(MEMORY_TRACE_FRAMES)
+            try:
+                sampler.start()
+                await asyncio.sleep(duration)
+            finally:
+                stop.set()
+                await asyncio.to_thread(sampler.join)
+                if trace_memory:
+                    snapshot = tracemalloc.take_snapshot()
+                    if started_tracing:
+                        tracemalloc.stop()
+                    profile.memory = self._format_memory(snapshot, memory_top)
+            return profile
+
+    def _sample(self, loop_thread_id: int, profile: Profile, stop: threading.Event) -> None:
+        own_id = threading.get_ident()
+        while not stop.wait(self.interval):
+            # Executor threads come and go, so the threads to sample are looked up every time
+            names = {
+                thread.ident: "event loop" if thread.ident == loop_thread_id else thread.name
+                for thread in threading.enumerate()
+                if thread.ident == loop_thread_id or thread.name.startswith(self.thread_prefixes)
+            }
+            for thread_id, frame in sys._current_frames().items():
+                name = names.get(thread_id)
+                if name is None or thread_id == own_id:
+                    continue
+                profile.stacks[(name, self._walk(frame))] += 1
+
+    @staticmethod
+    def _walk(frame: FrameType | None) -> tuple[Frame, ...]:
+        frames: list[Frame] = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append((code.co_filename, code.co_firstlineno, code.co_qualname))
+            frame = frame.f_back
+        frames.reverse()
+        if len(frames) > MAX_STACK_DEPTH:
+            # Keep the outermost frames so deep stacks still merge under their roots, and mark the cut
+            truncated = len(frames) - MAX_STACK_DEPTH + 1
+            frames[MAX_STACK_DEPTH - 1 :] = [(TRUNCATED_FILE, 0, f"{truncated} frames")]
+        return tuple(frames)
+
+    @staticmethod
+    def _format_memory(snapshot: tracemalloc.Snapshot, top: int) -> str:
+        snapshot = snapshot.filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            )
+        )
+        stats = snapshot.statistics("lineno")
+        total = sum(stat.size for stat in stats)
+        lines = [
+            f"Top {min(top, len(stats))} allocation sites, {total / 1024:.1f} KiB allocated while profiling and still held"
+        ]
+        for index, stat in enumerate(stats[:top], start=1):
+            frame = stat.traceback[0]
+            lines.append(
+                f"#{index} {frame.filename}:{frame.lineno}: {stat.size / 1024:.1f} KiB in {stat.count} blocks"
+            )
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,231 @@
+import asyncio
+import contextvars
+import enum
+import re
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, AsyncIterator
+
+import aiohttp
+import yarl
+from discord.http import Route
+from loguru import logger
+
+from core.metrics import Counter, Gauge, Histogram, route_template
+
+if TYPE_CHECKING:
+    from core.metrics import Metrics
+    from core.settings import RateLimitSettings
+
+DEFER_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Routes and buckets not used for this long are forgotten
+FORGET_AFTER = 300.0
+PRUNE_EVERY = 1000
+MAJOR_PARAMETER = re.compile(r"^/(?:channels|guilds|webhooks)/([0-9]+)")
+
+
+class Priority(enum.IntEnum):
+    # Replies to users and logs they rely on, e.g. join logs. Never deferred
+    HIGH = 0
+    # Work a user asked for but that can take a while, e.g. moving a whole voice channel
+    NORMAL = 1
+    # Background work: cache refreshes, reconciliation
+    LOW = 2
+
+
+_priority: contextvars.ContextVar[Priority] = contextvars.ContextVar("ratelimit_priority", default=Priority.HIGH)
+# Set when the request about to be sent was already counted in the global window by acquire()
+_reserved: contextvars.ContextVar[bool] = contextvars.ContextVar("ratelimit_reserved", default=False)
+
+
+def route_key(method: str, path: str) -> str:
+    """Key of a route, e.g. ``route_key("GET", f"/guilds/{guild.id}/invites")``.
+
+    Requests sharing a bucket share a key: the path is reduced to its template, only the major
+    parameter (channel, guild or webhook id) is kept, like Discord does for its buckets.
+    """
+    major = MAJOR_PARAMETER.match(path)
+    return f"{method.upper()} {route_template(path)} {major.group(1) if major else ''}".rstrip()
+
+
+@dataclass
+class Bucket:
+    limit: int
+    remaining: int
+    reset_at: float
+    last_used: float
+
+    def available(self, now: float) -> int:
+        return self.limit if now >= self.reset_at else self.remaining
+
+
+class RateLimitBudget:
+    """Tracks the Discord HTTP rate limit budget and defers low priority requests when it runs low.
+
+    Every response updates the remaining capacity of its bucket (from the ``X-RateLimit-*``
+    headers) and every request is counted in a one second window against the global limit.
+    Cogs wrap their calls in :meth:`priority`: high priority calls go through right away, normal
+    and low priority ones wait while the global window is past their share of the budget, and low
+    priority ones also while their bucket is, so background work and bulk operations leave room for
+    what users are waiting on.
+    discord.py still enforces the actual limits, this only decides who goes first.
+    """
+
+    def __init__(self, settings: "RateLimitSettings", metrics: "Metrics | None" = None) -> None:
+        self.settings = settings
+        self.routes: dict[str, str] = {}
+        self.buckets: dict[str, Bucket] = {}
+        self._window: deque[float] = deque()
+        self._responses = 0
+
+        self._remaining_metric: Gauge | None = None
+        self._deferred_metric: Histogram | None = None
+        self._ratelimited_metric: Counter | None = None
+        if metrics is not None:
+            metrics.registry.register(
+                Gauge(
+                    "mitbot_ratelimit_global_usage",
+                    "Share of the global rate limit used in the last second.",
+                    callback=self.global_usage,
+                )
+            )
+            self._remaining_metric = metrics.registry.register(
+                Gauge(
+                    "mitbot_ratelimit_bucket_remaining_ratio",
+                    "Share of the bucket left after the last response of a route.",
+                    ["method", "route"],
+                )
+            )
+            self._deferred_metric = metrics.registry.register(
+                Histogram(
+                    "mitbot_ratelimit_deferred_seconds",
+                    "Time requests waited for budget.",
+                    ["priority"],
+                    DEFER_BUCKETS,
+                )
+            )
+            self._ratelimited_metric = metrics.registry.register(
+                Counter(
+                    "mitbot_ratelimit_429_total",
+                    "Responses with status 429, by rate limit scope and priority.",
+                    ["method", "route", "scope", "priority"],
+                )
+            )
+
+    def global_usage(self) -> float:
+        self._trim_window(time.monotonic())
+        return len(self._window) / self.settings.global_limit
+
+    def bucket_for(self, route: str) -> Bucket | None:
+        bucket_key = self.routes.get(route)
+        return self.buckets.get(bucket_key) if bucket_key is not None else None
+
+    @asynccontextmanager
+    async def priority(self, priority: Priority, route: str | None = None) -> AsyncIterator[None]:
+        """Waits for budget for a call of ``priority`` (to ``route``, if given) and runs the block with it."""
+        priority_token = _priority.set(priority)
+        reserved_token = _reserved.set(False)
+        try:
+            await self.acquire(priority, route)
+            yield
+        finally:
+            _reserved.reset(reserved_token)
+            _priority.reset(priority_token)
+
+    async def acquire(self, priority: Priority, route: str | None = None) -> None:
+        if priority == Priority.HIGH:
+            return
+
+        share = self.settings.normal_share if priority == Priority.NORMAL else self.settings.low_share
+        allowed = max(1, int(self.settings.global_limit * share))
+        started_at = time.monotonic()
+        deadline = started_at + self.settings.max_defer
+        while (now := time.monotonic()) < deadline:
+            delay = 0.0
+            self._trim_window(now)
+            if len(self._window) >= allowed:
+                # Wait until enough requests leave the window
+                delay = self._window[len(self._window) - allowed] + 1.0 - now
+            bucket = self.bucket_for(route) if route is not None else None
+            if bucket is not None and priority == Priority.LOW:
+                reserve = bucket.limit * self.settings.bucket_reserve
+                if bucket.available(now) <= reserve:
+                    delay = max(delay, bucket.reset_at - now)
+            if delay <= 0:
+                break
+            await asyncio.sleep(min(delay, deadline - now))
+        else:
+            logger.warning(f"Gave up deferring a {priority.name} priority request after {self.settings.max_defer}s")
+
+        waited = time.monotonic() - started_at
+        if self._deferred_metric is not None and waited > 0.001:
+            self._deferred_metric.observe(waited, priority=priority.name.lower())
+        # Count the request now, so the other deferred calls see it before it is actually sent
+        self._window.append(time.monotonic())
+        _reserved.set(True)
+
+    def http_trace(self, trace: aiohttp.TraceConfig | None = None) -> aiohttp.TraceConfig:
+        """Adds the hooks following the budget to ``trace``, or to a new trace config."""
+        trace = trace or aiohttp.TraceConfig()
+
+        async def on_request_start(
+            session: aiohttp.ClientSession, context: SimpleNamespace, params: aiohttp.TraceRequestStartParams
+        ) -> None:
+            if _reserved.get():
+                _reserved.set(False)
+            else:
+                self._window.append(time.monotonic())
+
+        async def on_request_end(
+            session: aiohttp.ClientSession, context: SimpleNamespace, params: aiohttp.TraceRequestEndParams
+        ) -> None:
+            self._update(params.method, params.url, params.response)
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_request_end.append(on_request_end)
+        return trace
+
+    def _trim_window(self, now: float) -> None:
+        while self._window and self._window[0] <= now - 1.0:
+            self._window.popleft()
+
+    def _update(self, method: str, url: yarl.URL, response: aiohttp.ClientResponse) -> None:
+        path = url.path
+        base = yarl.URL(Route.BASE).path
+        if path.startswith(base):
+            path = path[len(base) :]
+        route = route_key(method, path)
+        headers = response.headers
+        now = time.monotonic()
+
+        if response.status == 429:
+            scope = headers.get("X-RateLimit-Scope") or ("global" if headers.get("X-RateLimit-Global") else "user")
+            logger.warning(f"Rate limited ({scope}) on {route} at {_priority.get().name} priority")
+            if self._ratelimited_metric is not None:
+                self._ratelimited_metric.inc(
+                    method=method, route=route_template(path), scope=scope, priority=_priority.get().name.lower()
+                )
+
+        bucket_hash = headers.get("X-RateLimit-Bucket")
+        if bucket_hash is None or "X-RateLimit-Remaining" not in headers:
+            return
+        major = MAJOR_PARAMETER.match(path)
+        bucket_key = f"{bucket_hash}:{major.group(1) if major else ''}"
+        limit = int(headers.get("X-RateLimit-Limit", 1))
+        remaining = int(headers["X-RateLimit-Remaining"])
+        reset_at = now + float(headers.get("X-RateLimit-Reset-After", 0))
+        self.routes[route] = bucket_key
+        self.buckets[bucket_key] = Bucket(limit, remaining, reset_at, now)
+        if self._remaining_metric is not None:
+            self._remaining_metric.set(remaining / limit if limit else 0.0, method=method, route=route_template(path))
+
+        self._responses += 1
+        if self._responses % PRUNE_EVERY == 0:
+            self._prune(now)
+
+    def _prune(self, now: float) -> None:
+        self.buckets = {key: bucket for key, bucket in self.buckets.items() if now - bucket.last_used < FORGET_AFTER}
+        self.routes = {route: key for route, key in self.routes.items() if key in self.buckets}
@@ -0,0 +1,79 @@
+import asyncio
+import gzip
+import json
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Any, Iterator
+
+from loguru import logger
+
+if TYPE_CHECKING:
+    from core.settings import RecorderSettings
+
+
+class GatewayRecorder:
+    """Records gateway dispatch payloads (op 0) to a gzip compressed NDJSON file.
+
+    Each line is ``{"ts": <seconds since recording started>, "t": <event name>, "d": <payload>}``.
+    Lines are buffered in memory and compressed/written in an executor so the event loop never
+    blocks on disk IO.
+    """
+
+    def __init__(self, settings: "RecorderSettings") -> None:
+        self.settings = settings
+        self.path = Path(datetime.now(timezone.utc).strftime(settings.path))
+        self.events = 0
+        self._file: IO[bytes] | None = None
+        self._buffer: list[bytes] = []
+        self._started_at = 0.0
+        self._flushing: asyncio.Future | None = None
+
+    def start(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = gzip.open(self.path, "ab")
+        self._started_at = time.perf_counter()
+        logger.info(f"Recording gateway events to {self.path}")
+
+    async def on_socket_raw_receive(self, msg: str | bytes) -> None:
+        # discord.py dispatches the frame as received, before decoding it
+        if self._file is None:
+            return
+        frame = json.loads(msg)
+        if frame.get("op") != 0:
+            return
+
+        line = {"ts": round(time.perf_counter() - self._started_at, 6), "t": frame["t"], "d": frame["d"]}
+        self._buffer.append(json.dumps(line, separators=(",", ":")).encode() + b"\n")
+        self.events += 1
+        if len(self._buffer) >= self.settings.flush_every and self._flushing is None:
+            await self.flush()
+
+    async def flush(self) -> None:
+        if self._file is None or not self._buffer:
+            return
+        lines, self._buffer = self._buffer, []
+        self._flushing = asyncio.get_running_loop().run_in_executor(None, self._file.writelines, lines)
+        try:
+            await self._flushing
+        finally:
+            self._flushing = None
+
+    async def stop(self) -> None:
+        if self._flushing is not None:
+            await self._flushing
+        await self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            logger.info(f"Recorded {self.events} gateway events to {self.path}")
+
+
+def read_recording(path: str | Path) -> Iterator[tuple[float, str, dict[str, Any]]]:
+    """Yields ``(timestamp, event name, payload)`` from a file written by :class:`GatewayRecorder`."""
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            yield event["ts"], event["t"], event["d"]
@@ -0,0 +1,285 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, Awaitable, Callable
+
+from loguru import logger
+
+from core.metrics import Counter, Histogram
+from core.tasks import log_task_failure
+
+if TYPE_CHECKING:
+    from core.metrics import Metrics
+
+JobFunc = Callable[..., Awaitable[Any]]
+
+SHUTDOWN_TIMEOUT = 10.0
+# A day of the month falls on each weekday at least every 40 years (28 usually, 40 around a century
+# year without a Feb 29), so a cron schedule that matches nothing within this never fires
+CRON_SEARCH_LIMIT = timedelta(days=41 * 366)
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+class Interval:
+    """Runs every ``seconds`` seconds, counted from the previous due time."""
+
+    def __init__(self, seconds: float) -> None:
+        if seconds <= 0:
+            raise ValueError("Interval must be positive")
+        self.seconds = seconds
+
+    def next_run(self, after: datetime) -> datetime:
+        return after + timedelta(seconds=self.seconds)
+
+    def __str__(self) -> str:
+        return f"every {self.seconds:g}s"
+
+
+class Cron:
+    """Cron-like schedule: ``minute hour day month weekday``, in UTC.
+
+    Each field is ``*``, a number, a range ``a-b``, a step ``*/n``, ``a-b/n`` or ``a/n`` (from ``a``
+    to the end of the range), or a comma separated list of those. Weekdays go from 0 (Sunday) to 6
+    (Saturday). Unlike cron, when both day and weekday are restricted a time has to match both.
+    Expressions that can never match, like ``0 0 30 2 *``, are rejected.
+    """
+
+    FIELDS = (("minute", 0, 59), ("hour", 0, 23), ("day", 1, 31), ("month", 1, 12), ("weekday", 0, 6))
+
+    def __init__(self, expression: str) -> None:
+        parts = expression.split()
+        if len(parts) != len(self.FIELDS):
+            raise ValueError(f"Cron expression must have {len(self.FIELDS)} fields: {expression!r}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            self._parse(part, low, high) for part, (_, low, high) in zip(parts, self.FIELDS)
+        )
+        try:
+            self.next_run(datetime.now(timezone.utc))
+        except ValueError:
+            raise ValueError(f"Cron expression never matches: {expression!r}") from None
+
+    @staticmethod
+    def _parse(part: str, low: int, high: int) -> frozenset[int]:
+        values: set[int] = set()
+        for item in part.split(","):
+            item_range, _, step = item.partition("/")
+            if item_range == "*":
+                start, end = low, high
+            elif "-" in item_range:
+                start, end = (int(value) for value in item_range.split("-", 1))
+            else:
+                start = int(item_range)
+                # "a/n" steps from a to the end of the range, as in cron
+                end = high if step else start
+            if not low <= start <= end <= high:
+                raise ValueError(f"Cron field {item!r} out of range {low}-{high}")
+            if step and int(step) < 1:
+                raise ValueError(f"Cron field {item!r} has an invalid step")
+            values.update(range(start, end + 1, int(step) if step else 1))
+        return frozenset(values)
+
+    def next_run(self, after: datetime) -> datetime:
+        candidate = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + CRON_SEARCH_LIMIT
+        # Skips whole months, days and hours that don't match, so this usually takes a few dozen steps
+        while True:
+            if candidate > limit:
+                raise ValueError(f"Cron expression {self.expression!r} never matches")
+            if candidate.month not in self.months:
+                year, month = divmod(candidate.month, 12)
+                candidate = candidate.replace(year=candidate.year + year, month=month + 1, day=1, hour=0, minute=0)
+            elif candidate.day not in self.days or (candidate.weekday() + 1) % 7 not in self.weekdays:
+                candidate = (candidate + timedelta(days=1)).replace(hour=0, minute=0)
+            elif candidate.hour not in self.hours:
+                candidate = (candidate + timedelta(hours=1)).replace(minute=0)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+
+    def __str__(self) -> str:
+        return f"cron {self.expression}"
+
+
+@dataclass
+class Job:
+    name: str
+    func: JobFunc
+    schedule: Interval | Cron
+    jitter: float = 0.0
+    timeout: float | None = None
+    max_concurrency: int = 1
+    owner: str | None = None
+
+    # Stats
+    runs: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    skipped: int = 0
+    last_run: datetime | None = None
+    last_duration: float | None = None
+    last_error: str | None = None
+    next_run: datetime | None = None
+    running: set[asyncio.Task] = field(default_factory=set)
+    _loop_task: asyncio.Task | None = None
+
+
+class Scheduler:
+    """Runs the periodic jobs registered by the cogs, and delayed one-shot calls.
+
+    A job that is still running when it is due again is skipped, unless ``max_concurrency``
+    allows more runs at the same time. Jobs are started with the scheduler, or right away when
+    added after it started.
+    """
+
+    def __init__(self, metrics: "Metrics | None" = None) -> None:
+        self.jobs: dict[str, Job] = {}
+        self._delayed: set[asyncio.Task] = set()
+        self._started = False
+
+        self._runs_metric: Counter | None = None
+        self._duration_metric: Histogram | None = None
+        if metrics is not None:
+            self._runs_metric = metrics.registry.register(
+                Counter("mitbot_job_runs_total", "Scheduled job runs.", ["job", "status"])
+            )
+            self._duration_metric = metrics.registry.register(
+                Histogram("mitbot_job_duration_seconds", "Scheduled job run time.", ["job"], DURATION_BUCKETS)
+            )
+
+    def add_job(
+        self,
+        name: str,
+        func: JobFunc,
+        *,
+        interval: float | None = None,
+        cron: str | None = None,
+        jitter: float = 0.0,
+        timeout: float | None = None,
+        max_concurrency: int = 1,
+        owner: str | None = None,
+    ) -> Job:
+        """Registers ``func`` to run every ``interval`` seconds or on the ``cron`` schedule.
+
+        Each run is delayed by a random amount up to ``jitter`` seconds and cancelled after
+        ``timeout`` seconds. ``owner`` groups the jobs of a cog so they can be removed together.
+        """
+        if (interval is None) == (cron is None):
+            raise ValueError("A job needs either an interval or a cron schedule")
+        if name in self.jobs:
+            raise ValueError(f"Job {name} already registered")
+
+        schedule = Interval(interval) if interval is not None else Cron(cron)  # type: ignore
+        job = Job(name, func, schedule, jitter, timeout, max(1, max_concurrency), owner)
+        self.jobs[name] = job
+        if self._started:
+            self._start_job(job)
+        return job
+
+    async def remove_job(self, name: str, *, flush: bool = False) -> None:
+        """Stops scheduling a job. With ``flush``, runs it one last time, otherwise cancels its runs."""
+        job = self.jobs.pop(name, None)
+        if job is None:
+            return
+        if job._loop_task is not None:
+            job._loop_task.cancel()
+        if flush:
+            if job.running:
+                await asyncio.wait(job.running)
+            await self._run(job)
+        else:
+            for task in job.running:
+                task.cancel()
+            await asyncio.gather(*job.running, return_exceptions=True)
+
+    async def remove_owner(self, owner: str, *, flush: bool = False) -> None:
+        """Removes every job of ``owner``, to be called from ``cog_unload``."""
+        names = [name for name, job in self.jobs.items() if job.owner == owner]
+        await asyncio.gather(*(self.remove_job(name, flush=flush) for name in names))
+
+    def call_later(self, delay: float, func: JobFunc, *args: Any, name: str | None = None) -> asyncio.Task:
+        """Runs ``func(*args)`` once after ``delay`` seconds. Pending calls are cancelled on shutdown."""
+
+        async def delayed() -> None:
+            await asyncio.sleep(delay)
+            try:
+                await func(*args)
+            except Exception:
+                logger.exception(f"Error in delayed call {name or func.__qualname__}")
+
+        task = asyncio.create_task(delayed(), name=f"mitbot: delayed {name or func.__qualname__}")
+        self._delayed.add(task)
+        task.add_done_callback(self._delayed.discard)
+        return task
+
+    def start(self) -> None:
+        self._started = True
+        for job in self.jobs.values():
+            self._start_job(job)
+
+    async def close(self, timeout: float = SHUTDOWN_TIMEOUT) -> None:
+        """Stops every job, giving running ones ``timeout`` seconds to finish before cancelling them."""
+        self._started = False
+        for job in self.jobs.values():
+            if job._loop_task is not None:
+                job._loop_task.cancel()
+        for task in self._delayed:
+            task.cancel()
+
+        running = {task for job in self.jobs.values() for task in job.running}
+        if running:
+            logger.debug(f"Waiting for {len(running)} running jobs")
+            _, pending = await asyncio.wait(running, timeout=timeout)
+            for task in pending:
+                task.cancel()
+        await asyncio.gather(*running, *self._delayed, return_exceptions=True)
+
+    def _start_job(self, job: Job) -> None:
+        job._loop_task = asyncio.create_task(self._job_loop(job), name=f"mitbot: job {job.name}")
+        # The loop itself is not supposed to fail, but a failure would silently stop the job
+        job._loop_task.add_done_callback(log_task_failure)
+
+    async def _job_loop(self, job: Job) -> None:
+        due = datetime.now(timezone.utc)
+        while True:
+            due = job.schedule.next_run(max(due, datetime.now(timezone.utc)))
+            job.next_run = due
+            delay = (due - datetime.now(timezone.utc)).total_seconds() + random.uniform(0, job.jitter)
+            await asyncio.sleep(max(0.0, delay))
+
+            if len(job.running) >= job.max_concurrency:
+                job.skipped += 1
+                logger.warning(f"Job {job.name} is still running, skipping this run")
+                if self._runs_metric is not None:
+                    self._runs_metric.inc(job=job.name, status="skipped")
+                continue
+
+            task = asyncio.create_task(self._run(job), name=f"mitbot: job {job.name} run")
+            job.running.add(task)
+            task.add_done_callback(job.running.discard)
+
+    async def _run(self, job: Job) -> None:
+        status = "ok"
+        job.last_run = datetime.now(timezone.utc)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(job.func(), job.timeout)
+        except asyncio.TimeoutError:
+            status = "timeout"
+            job.timeouts += 1
+            job.last_error = f"timed out after {job.timeout}s"
+            logger.error(f"Job {job.name} timed out after {job.timeout}s")
+        except Exception as error:
+            status = "error"
+            job.failures += 1
+            job.last_error = repr(error)
+            logger.exception(f"Error in job {job.name}")
+        finally:
+            job.runs += 1
+            job.last_duration = time.perf_counter() - start
+            if self._runs_metric is not None and self._duration_metric is not None:
+                self._runs_metric.inc(job=job.name, status=status)
+                self._duration_metric.observe(job.last_duration, job=job.name)
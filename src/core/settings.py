@@ -1,9 +1,17 @@
 import os
 import re
-from typing import Annotated, Dict, Generic, Tuple, Type, TypeVar
+from typing import Annotated, Dict, Generic, Literal, Tuple, Type, TypeVar
 
 from pydantic_settings import BaseSettings, PydanticBaseSettingsSource, SettingsConfigDict, TomlConfigSettingsSource
-from pydantic import AfterValidator, BaseModel, BeforeValidator, Field, ValidationError, field_validator
+from pydantic import (
+    AfterValidator,
+    BaseModel,
+    BeforeValidator,
+    Field,
+    ValidationError,
+    ValidationInfo,
+    field_validator,
+)
 import discord
 
 from loguru import logger
@@ -29,6 +37,9 @@ PartialEmoji = Annotated[
 class BotSettings(BaseModel):
     token: str = "TOKEN"
     initial_extensions: list[str]
+    # Overrides of the Discord endpoints, used to run against a local fake gateway
+    api_base: str | None = None
+    gateway_url: str | None = None
 
 
 class MuskySettings(BaseModel):
@@ -54,11 +65,104 @@ class EmojiSettings(BaseModel):
     model_config = SettingsConfigDict(arbitrary_types_allowed=True)
 
 
+class MetricsSettings(BaseModel):
+    enabled: bool = False
+    host: str = "127.0.0.1"
+    port: int = 9100
+
+
+class LoopMonitorSettings(BaseModel):
+    enabled: bool = True
+    interval: float = 0.5
+    threshold: float = 0.25
+    history: int = 50
+
+
+class DatabaseSettings(BaseModel):
+    backend: Literal["prisma", "sqlite", "postgres"] = "prisma"
+    sqlite_path: str = "./prisma/data/database.db"
+    postgres_dsn: str | None = Field(default=None, validate_default=True)
+    pool_min_size: int = 1
+    pool_max_size: int = 10
+
+    @field_validator("postgres_dsn")
+    @classmethod
+    def default_postgres_dsn(cls, value: str | None) -> str | None:
+        # POSTGRES_DSN is the name of the secret the Justfile and the compose files already pass
+        return value or os.environ.get("POSTGRES_DSN") or None
+
+
+class RecorderSettings(BaseModel):
+    enabled: bool = False
+    # strftime pattern, evaluated when the bot starts
+    path: str = "./recordings/gateway-%Y%m%d-%H%M%S.ndjson.gz"
+    flush_every: int = 500
+
+
+class CacheSettings(BaseModel):
+    # 0 disables the message cache, the cogs only use raw reaction events
+    max_messages: int | None = 1000
+    # Members in voice channels, needed by the mover cog
+    member_cache_voice: bool = True
+    # Members that join or are chunked during the session
+    member_cache_joined: bool = True
+    # Guilds whose member list is chunked when the bot gets ready. Needs member_cache_joined: with the
+    # voice flag alone, discord.py drops members when they leave voice and never caches new ones, so
+    # the list wouldn't stay complete. The flags are global, joins are then cached in every guild
+    chunk_guild_ids: list[Snowflake] = []
+
+    @field_validator("max_messages")
+    @classmethod
+    def disable_message_cache(cls, value: int | None) -> int | None:
+        # discord.py treats 0 as the default size, it has to be None to disable the cache
+        return value if value else None
+
+    @field_validator("chunk_guild_ids")
+    @classmethod
+    def chunking_needs_joined(cls, value: list[int], info: ValidationInfo) -> list[int]:
+        if value and not info.data.get("member_cache_joined", True):
+            raise ValueError("chunk_guild_ids needs member_cache_joined, chunked members wouldn't stay cached")
+        return value
+
+
+class RateLimitSettings(BaseModel):
+    # Requests per second allowed by Discord for the whole bot
+    global_limit: int = 50
+    # Share of the global limit normal and low priority requests may use before being deferred
+    normal_share: float = 0.8
+    low_share: float = 0.5
+    # Share of a bucket low priority requests leave to the others
+    bucket_reserve: float = 0.25
+    # Deferred requests are sent anyway after waiting this long, in seconds
+    max_defer: float = 30.0
+
+
+class ClusterSettings(BaseModel):
+    # Set by the launcher for each process it spawns
+    enabled: bool = False
+    cluster_id: int = 0
+    shard_ids: list[int] | None = None
+    # None asks Discord for the recommended count
+    shard_count: int | None = None
+    # Used by the launcher only
+    clusters: int = 1
+    ipc_host: str = "127.0.0.1"
+    ipc_port: int = 8765
+    health_interval: float = 15.0
+
+
 class Settings(BaseSettings):
     bot: BotSettings
     musky: MuskySettings
     guilds: dict[Snowflake, GuildSettings]
     emojis: EmojiSettings
+    database: DatabaseSettings = DatabaseSettings()
+    cache: CacheSettings = CacheSettings()
+    metrics: MetricsSettings = MetricsSettings()
+    loop_monitor: LoopMonitorSettings = LoopMonitorSettings()
+    recorder: RecorderSettings = RecorderSettings()
+    ratelimit: RateLimitSettings = RateLimitSettings()
+    cluster: ClusterSettings = ClusterSettings()
 
     model_config = SettingsConfigDict(
         env_ignore_empty=True,
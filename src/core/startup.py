@@ -0,0 +1,32 @@
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+
+class StartupTimer:
+    """Collects how long each startup phase took, relative to when the process started importing."""
+
+    def __init__(self, origin: float | None = None) -> None:
+        self.origin = origin if origin is not None else time.perf_counter()
+        self.phases: dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - start
+
+    def mark(self, name: str, since: float) -> None:
+        """Records a phase that started at ``since`` (a ``time.perf_counter()`` value) and ends now."""
+        self.phases[name] = time.perf_counter() - since
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.origin
+
+    def report(self) -> str:
+        width = max((len(name) for name in self.phases), default=0)
+        lines = [f"{name.ljust(width)}  {duration * 1000:8.1f}ms" for name, duration in self.phases.items()]
+        lines.append(f"{'time to ready'.ljust(width)}  {self.elapsed() * 1000:8.1f}ms")
+        return "\n".join(lines)
@@ -0,0 +1,30 @@
+import asyncio
+from typing import Any, Coroutine
+
+from loguru import logger
+
+
+def log_task_failure(task: asyncio.Task) -> None:
+    """Done callback logging the exception a task failed with, which would otherwise go unnoticed."""
+    if task.cancelled():
+        return
+    error = task.exception()
+    if error is not None:
+        logger.opt(exception=error).error(f"Task {task.get_name()} failed")
+
+
+def create_background_task(
+    tasks: set[asyncio.Task], coro: Coroutine[Any, Any, Any], *, name: str | None = None
+) -> asyncio.Task:
+    """Runs ``coro`` in a task kept in ``tasks`` until it is done, so it isn't garbage collected midway."""
+    task = asyncio.create_task(coro, name=name)
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+    task.add_done_callback(log_task_failure)
+    return task
+
+
+async def cancel_tasks(tasks: set[asyncio.Task]) -> None:
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
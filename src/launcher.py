@@ -0,0 +1,191 @@
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+from aiohttp import ClientSession
+from loguru import logger
+
+from core.cluster import read_message, split_shards, write_message
+from core.log import setup_logger
+from core.settings import Settings
+from core.tasks import create_background_task
+
+MAIN = Path(__file__).with_name("main.py")
+RESTART_DELAY = 5.0
+SHUTDOWN_TIMEOUT = 10.0
+COMMAND_TIMEOUT = 10.0
+
+
+class Cluster:
+    def __init__(self, cluster_id: int, shard_ids: list[int]) -> None:
+        self.id = cluster_id
+        self.shard_ids = shard_ids
+        self.process: asyncio.subprocess.Process | None = None
+        self.writer: asyncio.StreamWriter | None = None
+        self.health: dict[str, Any] = {}
+        self.health_at = 0.0
+        self.restarts = 0
+
+
+class Launcher:
+    """Runs each group of shards in its own process and relays IPC messages between them."""
+
+    def __init__(self, settings: Settings) -> None:
+        self.settings = settings
+        self.clusters: dict[int, Cluster] = {}
+        self.stopping = asyncio.Event()
+        self._pending: dict[tuple[int, int], asyncio.Future[Any]] = {}
+        self._forward_ids = 0
+        self._tasks: set[asyncio.Task] = set()
+
+    async def _recommended_shards(self) -> int:
+        api_base = self.settings.bot.api_base or "https://discord.com/api/v10"
+        headers = {"Authorization": f"Bot {self.settings.bot.token}"}
+        async with ClientSession() as session:
+            async with session.get(f"{api_base}/gateway/bot", headers=headers) as response:
+                response.raise_for_status()
+                data = await response.json()
+        return data["shards"]
+
+    def _environment(self, cluster: Cluster, shard_count: int) -> dict[str, str]:
+        env = dict(os.environ)
+        env["CLUSTER__ENABLED"] = "true"
+        env["CLUSTER__CLUSTER_ID"] = str(cluster.id)
+        env["CLUSTER__SHARD_IDS"] = json.dumps(cluster.shard_ids)
+        env["CLUSTER__SHARD_COUNT"] = str(shard_count)
+        # Every process serves its own metrics
+        env["METRICS__PORT"] = str(self.settings.metrics.port + cluster.id)
+        return env
+
+    async def _supervise(self, cluster: Cluster, shard_count: int) -> None:
+        while not self.stopping.is_set():
+            logger.info(f"Starting cluster {cluster.id} with shards {cluster.shard_ids}")
+            cluster.process = await asyncio.create_subprocess_exec(
+                sys.executable,
+                str(MAIN),
+                env=self._environment(cluster, shard_count),
+                cwd=os.getcwd(),
+            )
+            code = await cluster.process.wait()
+            if self.stopping.is_set():
+                break
+            cluster.restarts += 1
+            logger.error(f"Cluster {cluster.id} exited with code {code}, restarting in {RESTART_DELAY} seconds")
+            await asyncio.sleep(RESTART_DELAY)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        cluster: Cluster | None = None
+        try:
+            while (message := await read_message(reader)) is not None:
+                op = message["op"]
+                if op == "hello":
+                    cluster = self.clusters[message["cluster"]]
+                    cluster.writer = writer
+                    logger.info(f"Cluster {cluster.id} connected to IPC")
+                elif op == "health" and cluster is not None:
+                    cluster.health = message
+                    cluster.health_at = time.time()
+                elif op == "reply" and cluster is not None:
+                    future = self._pending.get((cluster.id, message["id"]))
+                    if future is not None and not future.done():
+                        future.set_result(message.get("result"))
+                elif op == "command":
+                    create_background_task(self._tasks, self._handle_command(writer, message))
+        except (OSError, json.JSONDecodeError, KeyError):
+            logger.exception("Invalid IPC connection")
+        finally:
+            if cluster is not None and cluster.writer is writer:
+                cluster.writer = None
+            writer.close()
+
+    async def _handle_command(self, writer: asyncio.StreamWriter, message: dict[str, Any]) -> None:
+        if message["name"] == "status":
+            result: Any = self.status()
+        else:
+            result = await self._broadcast(message["name"], message.get("args", {}))
+        await write_message(writer, {"op": "reply", "id": message["id"], "result": result})
+
+    async def _broadcast(self, name: str, args: dict[str, Any]) -> dict[str, Any]:
+        async def forward(cluster: Cluster) -> Any:
+            if cluster.writer is None:
+                return {"error": "not connected"}
+            self._forward_ids += 1
+            key = (cluster.id, self._forward_ids)
+            future: asyncio.Future[Any] = asyncio.get_running_loop().create_future()
+            self._pending[key] = future
+            try:
+                await write_message(
+                    cluster.writer, {"op": "command", "id": self._forward_ids, "name": name, "args": args}
+                )
+                return await asyncio.wait_for(future, COMMAND_TIMEOUT)
+            except (OSError, asyncio.TimeoutError):
+                return {"error": "no reply"}
+            finally:
+                self._pending.pop(key, None)
+
+        clusters = list(self.clusters.values())
+        results = await asyncio.gather(*(forward(cluster) for cluster in clusters))
+        return {str(cluster.id): result for cluster, result in zip(clusters, results)}
+
+    def status(self) -> dict[str, Any]:
+        return {
+            str(cluster.id): {
+                "shards": cluster.shard_ids,
+                "pid": cluster.process.pid if cluster.process else None,
+                "connected": cluster.writer is not None,
+                "restarts": cluster.restarts,
+                "last_health": cluster.health_at,
+                **{key: value for key, value in cluster.health.items() if key not in ("op", "cluster")},
+            }
+            for cluster in self.clusters.values()
+        }
+
+    async def _shutdown(self) -> None:
+        self.stopping.set()
+        processes = [cluster.process for cluster in self.clusters.values() if cluster.process is not None]
+        for process in processes:
+            if process.returncode is None:
+                process.terminate()
+        try:
+            await asyncio.wait_for(asyncio.gather(*(process.wait() for process in processes)), SHUTDOWN_TIMEOUT)
+        except asyncio.TimeoutError:
+            for process in processes:
+                if process.returncode is None:
+                    process.kill()
+
+    async def run(self) -> None:
+        cluster_settings = self.settings.cluster
+        shard_count = cluster_settings.shard_count or await self._recommended_shards()
+        for cluster_id, shard_ids in enumerate(split_shards(shard_count, cluster_settings.clusters)):
+            self.clusters[cluster_id] = Cluster(cluster_id, shard_ids)
+        logger.info(f"Launching {shard_count} shards in {len(self.clusters)} clusters")
+
+        server = await asyncio.start_server(
+            self._handle_connection, cluster_settings.ipc_host, cluster_settings.ipc_port
+        )
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, lambda: create_background_task(self._tasks, self._shutdown()))
+
+        async with server:
+            supervisors = [
+                asyncio.create_task(self._supervise(cluster, shard_count)) for cluster in self.clusters.values()
+            ]
+            await self.stopping.wait()
+            await asyncio.gather(*supervisors, return_exceptions=True)
+        logger.info("All clusters stopped")
+
+
+def main() -> None:
+    setup_logger()
+    settings = Settings()  # type: ignore
+    asyncio.run(Launcher(settings).run())
+
+
+if __name__ == "__main__":
+    main()
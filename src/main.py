@@ -1,26 +1,97 @@
+import time
+
+PROCESS_STARTED_AT = time.perf_counter()
+
 import asyncio
+from contextlib import nullcontext
+from typing import Any, Callable, Coroutine
 
-import prisma
 import discord
+import yarl
 from aiohttp import ClientSession
+from discord import app_commands
 from discord.ext import commands
+from discord.gateway import DiscordWebSocket
+from discord.http import Route
 from loguru import logger
 
 from core.settings import Settings
+from core.cluster import ClusterClient
 from core.context import MitsuakyContext
 from core.log import setup_logger
+from core.loopmonitor import LoopMonitor, running_handler, set_handler
+from core.ratelimit import RateLimitBudget
+from core.recorder import GatewayRecorder
+from core.scheduler import Scheduler
+from core.database import Repository, create_repository
+from core.metrics import InstrumentedRepository, Metrics
+from core.startup import StartupTimer
+from core.tasks import cancel_tasks, create_background_task
+
+
+class MitCommandTree(app_commands.CommandTree["MitBot"]):
+    async def interaction_check(self, interaction: discord.Interaction["MitBot"], /) -> bool:
+        # Runs in the task invoking the command, which ends with it, so the handler is never reset
+        # Handlers are only recorded for the loop monitor, disabled diagnostics cost nothing
+        command = interaction.command
+        if command is not None and self.client.loop_monitor is not None:
+            set_handler(f"/{command.qualified_name} ({command.callback.__qualname__})")
+        if self.client.metrics is not None:
+            interaction.extras["started_at"] = time.perf_counter()
+        return True
+
+    async def on_error(
+        self, interaction: discord.Interaction["MitBot"], error: app_commands.AppCommandError, /
+    ) -> None:
+        if self.client.metrics is not None:
+            self.client.metrics.observe_app_command(interaction, "error")
+        await super().on_error(interaction, error)
 
 
 class MitBot(commands.Bot):
     def __init__(
         self,
         settings: Settings,
-        prisma: prisma.Prisma,
+        db: Repository,
         web_client: ClientSession,
+        startup: StartupTimer | None = None,
+        **options: Any,
     ):
-        self.prisma = prisma
         self.web_client = web_client
         self.settings = settings
+        self.startup = startup or StartupTimer()
+        self._login_started_at = 0.0
+        self._gateway_started_at = 0.0
+        self._db_connect: asyncio.Task[None] | None = None
+        self._background_tasks: set[asyncio.Task] = set()
+
+        # Metrics are fully opt-in: when disabled nothing is wrapped and no metrics hooks are installed
+        self.metrics: Metrics | None = None
+        if settings.metrics.enabled:
+            self.metrics = Metrics(settings.metrics)
+            self.metrics.track_gateway_latency(self)
+            db = InstrumentedRepository(db, self.metrics)  # type: ignore
+        self.db = db
+
+        # The rate limit budget follows every request, the metrics hooks share its trace config
+        self.ratelimits = RateLimitBudget(settings.ratelimit, self.metrics)
+        http_trace = self.ratelimits.http_trace()
+        if self.metrics is not None:
+            self.metrics.http_trace(http_trace)
+
+        self.loop_monitor: LoopMonitor | None = None
+        if settings.loop_monitor.enabled:
+            self.loop_monitor = LoopMonitor(settings.loop_monitor, self.metrics)
+
+        self.recorder: GatewayRecorder | None = None
+        if settings.recorder.enabled:
+            self.recorder = GatewayRecorder(settings.recorder)
+
+        self.scheduler = Scheduler(self.metrics)
+
+        self.cluster: ClusterClient | None = None
+        if settings.cluster.enabled:
+            self.cluster = ClusterClient(self, settings.cluster)
 
         allowed_mentions = discord.AllowedMentions(
             roles=False,
@@ -32,13 +103,23 @@ class MitBot(commands.Bot):
         intents.message_content = True
         intents.members = True
 
+        member_cache_flags = discord.MemberCacheFlags(
+            voice=settings.cache.member_cache_voice,
+            joined=settings.cache.member_cache_joined,
+        )
+
         super().__init__(
             command_prefix=commands.when_mentioned,
             pm_help=None,
             chunk_guilds_at_startup=False,
+            member_cache_flags=member_cache_flags,
+            max_messages=settings.cache.max_messages,
             allowed_mentions=allowed_mentions,
             intents=intents,
             enable_debug_events=True,
+            tree_cls=MitCommandTree,
+            http_trace=http_trace,
+            **options,
         )
 
     async def get_or_fetch_guild(self, guild_id: int) -> discord.Guild | None:
@@ -102,33 +183,175 @@ class MitBot(commands.Bot):
             return None
         return members[0]
 
+    async def _run_event(
+        self,
+        coro: Callable[..., Coroutine[Any, Any, Any]],
+        event_name: str,
+        *args: Any,
+        **kwargs: Any,
+    ) -> None:
+        listener = getattr(coro, "__qualname__", event_name)
+        with running_handler(listener) if self.loop_monitor is not None else nullcontext():
+            if self.metrics is None:
+                return await super()._run_event(coro, event_name, *args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                await coro(*args, **kwargs)
+            except asyncio.CancelledError:
+                pass
+            except Exception:
+                self.metrics.listener_errors.inc(listener=listener)
+                try:
+                    await self.on_error(event_name, *args, **kwargs)
+                except asyncio.CancelledError:
+                    pass
+            finally:
+                self.metrics.listener_latency.observe(time.perf_counter() - start, listener=listener)
+
+    async def start(self, token: str, *, reconnect: bool = True) -> None:
+        # Connecting (spawning the Prisma query engine, filling the pool) takes a while, do it while logging in
+        self._login_started_at = time.perf_counter()
+        self._db_connect = asyncio.create_task(self._connect_database())
+        await super().start(token, reconnect=reconnect)
+
+    async def _connect_database(self) -> None:
+        with self.startup.phase("db connect"):
+            await self.db.connect()
+
+    async def _load_extension(self, extension: str) -> None:
+        try:
+            with self.startup.phase(f"extension {extension}"):
+                await self.load_extension(extension)
+        except Exception:
+            logger.exception(f"Error while loading extension {extension}")
+
+    async def _load_jishaku(self) -> None:
+        try:
+            with self.startup.phase("extension jishaku"):
+                await self.load_extension("jishaku")
+        except Exception:
+            logger.exception("Error while loading extension jishaku")
+
     async def setup_hook(self):
+        self.startup.mark("login", self._login_started_at)
+
+        if self.metrics is not None:
+            await self.metrics.start()
+        if self.loop_monitor is not None:
+            self.loop_monitor.start()
+        if self.recorder is not None:
+            self.recorder.start()
+            self.add_listener(self.recorder.on_socket_raw_receive)
+        if self.cluster is not None:
+            self.cluster.start()
+        self.scheduler.start()
+
         initial_extensions = self.settings.bot.initial_extensions
         if initial_extensions:
-            for extension in initial_extensions:
-                try:
-                    await self.load_extension(extension)
-                except Exception:
-                    logger.exception(f"Error while loading extension {extension}")
+            # Extensions don't depend on each other, so their async setup can run concurrently
+            await asyncio.gather(*(self._load_extension(extension) for extension in initial_extensions))
+
+        # Events may hit the database as soon as the gateway connects
+        if self._db_connect is not None:
+            await self._db_connect
+        self._gateway_started_at = time.perf_counter()
+
+    async def _chunk_guilds(self) -> None:
+        # Members are only chunked for the guilds that need them, instead of chunk_guilds_at_startup
+        for guild_id in self.settings.cache.chunk_guild_ids:
+            guild = self.get_guild(guild_id)
+            if guild is None or guild.chunked:
+                continue
+            try:
+                members = await guild.chunk(cache=True)
+            except Exception:
+                logger.exception(f"Error while chunking guild {guild.name}")
+            else:
+                logger.debug(f"Chunked {len(members)} members of guild {guild.name}")
 
     async def on_ready(self):
+        if self.settings.cache.chunk_guild_ids:
+            create_background_task(self._background_tasks, self._chunk_guilds(), name="mitbot: chunk guilds")
+
         if not hasattr(self, "uptime"):
             self.uptime = discord.utils.utcnow()
+            self.startup.mark("gateway handshake", self._gateway_started_at)
+            logger.info(f"Startup timings:\n{self.startup.report()}")
+            if self.metrics is not None:
+                self.metrics.observe_startup(self.startup)
+
+            # always load jishaku to have at least basic remote control/debug, but out of the way of startup
+            if "jishaku" not in self.extensions:
+                create_background_task(self._background_tasks, self._load_jishaku(), name="mitbot: load jishaku")
 
     async def on_message(self, message: discord.Message) -> None:
         ctx = await self.get_context(message, cls=MitsuakyContext)
         await self.invoke(ctx)
 
+    async def invoke(self, ctx: commands.Context["MitBot"], /) -> None:  # type: ignore
+        if ctx.command is None or self.loop_monitor is None:
+            return await super().invoke(ctx)
+        with running_handler(f"{ctx.command.qualified_name} ({ctx.command.callback.__qualname__})"):
+            await super().invoke(ctx)
+
+    async def on_app_command_completion(
+        self, interaction: discord.Interaction, command: app_commands.Command | app_commands.ContextMenu
+    ) -> None:
+        if self.metrics is not None:
+            self.metrics.observe_app_command(interaction, "ok")
+
+    async def close(self) -> None:
+        # Jobs may still need the HTTP client and the database
+        await self.scheduler.close()
+        await cancel_tasks(self._background_tasks)
+        await super().close()
+        if self.cluster is not None:
+            await self.cluster.close()
+        if self.recorder is not None:
+            await self.recorder.stop()
+        if self.loop_monitor is not None:
+            await self.loop_monitor.stop()
+        if self.metrics is not None:
+            await self.metrics.stop()
+        await self.db.close()
+
+
+class ShardedMitBot(MitBot, commands.AutoShardedBot):
+    """Runs the shards given by the cluster settings, or every shard when there's no launcher."""
+
+    def __init__(
+        self,
+        settings: Settings,
+        db: Repository,
+        web_client: ClientSession,
+        startup: StartupTimer | None = None,
+    ):
+        super().__init__(
+            settings,
+            db,
+            web_client,
+            startup,
+            shard_ids=settings.cluster.shard_ids,
+            shard_count=settings.cluster.shard_count,
+        )
+
 
 async def main():
+    startup = StartupTimer(PROCESS_STARTED_AT)
+    startup.mark("imports", PROCESS_STARTED_AT)
     setup_logger()
-    settings = Settings()  # type: ignore
-    async with prisma.Prisma() as db:
-        async with ClientSession() as aio_client:
-            async with MitBot(settings, db, aio_client) as bot:
-                # always load jishaku to have at least basic remote control/debug
-                await bot.load_extension("jishaku")
-                await bot.start(settings.bot.token)
+    with startup.phase("settings validation"):
+        settings = Settings()  # type: ignore
+    if settings.bot.api_base is not None:
+        Route.BASE = settings.bot.api_base
+    if settings.bot.gateway_url is not None:
+        DiscordWebSocket.DEFAULT_GATEWAY = yarl.URL(settings.bot.gateway_url)
+
+    bot_cls = ShardedMitBot if settings.cluster.enabled else MitBot
+    async with ClientSession() as aio_client:
+        async with bot_cls(settings, create_repository(settings.database), aio_client, startup) as bot:
+            await bot.start(settings.bot.token)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,302 @@
+"""Reaction storm benchmark for the Karma cog.
+
+Builds synthetic messages and reaction events with a Zipf skew over posts (a few viral ones, a long
+tail) and drives them straight into the Karma cog listeners, backed by a local database and a fake
+Discord HTTP layer. Also measures how the /karma query grows with the rows stored per author.
+
+Runs on SQLite by default. ``--backend postgres`` needs a scratch database, its karma messages are
+deleted before the run, and ``--backend prisma`` uses a temporary SQLite file through Prisma.
+
+Usage (from the directory holding settings.toml, with src/ importable)::
+
+    python -m tools.bench_karma --messages 2000 --events 50000 --concurrency 32
+    python -m tools.bench_karma --backend postgres --postgres-dsn postgresql://localhost/mitbot_bench
+    python -m tools.bench_karma --compare benchmarks/karma-20240101-120000.json
+
+The results are written as JSON (``--output``) so runs can be compared with ``--compare``.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import platform
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, cast
+
+import discord
+from aiohttp import ClientSession
+from discord import RawReactionActionEvent
+from loguru import logger
+
+from core.log import setup_logger
+from core.metrics import InstrumentedRepository, Metrics
+from core.settings import Settings
+from main import MitBot
+from tools.benchmarks import BACKENDS, benchmark_repository, latency_stats
+from tools.fakes import guild_payload, install_fake_http, member_payload, offline_settings, user_payload
+
+if TYPE_CHECKING:
+    from cogs.karma import Karma
+
+AUTHOR_BASE_ID = 100000000000000000
+VOTER_BASE_ID = 200000000000000000
+MESSAGE_BASE_ID = 1000000000000000000
+ROWS_PER_AUTHOR = (10, 100, 1000, 10000)
+
+
+def message_payload(message_id: int, channel_id: int, guild_id: int, author_id: int) -> dict[str, Any]:
+    return {
+        "id": str(message_id),
+        "channel_id": str(channel_id),
+        "guild_id": str(guild_id),
+        "author": user_payload(author_id),
+        "content": "https://example.com/meme.png",
+        "embeds": [],
+        "attachments": [],
+        "mentions": [],
+        "mention_roles": [],
+        "mention_everyone": False,
+        "pinned": False,
+        "tts": False,
+        "type": 0,
+        "edited_timestamp": None,
+        "timestamp": "2024-01-01T00:00:00+00:00",
+    }
+
+
+def zipf_choices(rng: random.Random, population: int, count: int, skew: float) -> list[int]:
+    """Draws ``count`` indexes in ``range(population)``, index ``k`` weighted by ``1 / (k + 1) ** skew``."""
+    cum_weights = list(itertools.accumulate(1 / (rank**skew) for rank in range(1, population + 1)))
+    return rng.choices(range(population), cum_weights=cum_weights, k=count)
+
+
+class StatementCounter:
+    """Counts the SQL statements SQLite runs, through the connection trace callback."""
+
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __call__(self, statement: str) -> None:
+        self.count += 1
+
+
+async def run_stream(handler: Any, events: list[Any], concurrency: int) -> tuple[float, list[float]]:
+    """Feeds ``events`` to ``handler`` from ``concurrency`` workers. Returns elapsed time and per call latency."""
+    queue: asyncio.Queue[Any] = asyncio.Queue()
+    for event in events:
+        queue.put_nowait(event)
+    timings: list[float] = []
+
+    async def worker() -> None:
+        while not queue.empty():
+            event = queue.get_nowait()
+            start = time.perf_counter()
+            await handler(event)
+            timings.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start, timings
+
+
+async def bench_query_growth(bot: MitBot, channel_id: int, repeat: int) -> list[dict[str, Any]]:
+    """Times the /karma query for authors owning more and more tracked messages."""
+    results = []
+    message_ids = itertools.count(MESSAGE_BASE_ID * 2)
+    for index, rows in enumerate(ROWS_PER_AUTHOR):
+        author_id = AUTHOR_BASE_ID * 3 + index
+        for _ in range(rows):
+            await bot.db.create_karma_message(next(message_ids), author_id, channel_id)
+
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            await bot.db.get_karma(author_id)
+            timings.append(time.perf_counter() - start)
+        results.append({"rows_per_author": rows, **latency_stats(timings)})
+    return results
+
+
+async def bench(args: argparse.Namespace, settings: Settings) -> dict[str, Any]:
+    rng = random.Random(args.seed)
+    guild_settings = next(iter(settings.guilds.items()), None)
+    if guild_settings is None or not guild_settings[1].karma_channels_ids:
+        raise SystemExit("settings.toml needs a guild with karma_channels_ids to run this benchmark")
+    guild_id, channel_id = guild_settings[0], guild_settings[1].karma_channels_ids[0]
+    upvote, downvote = settings.emojis.upvote, settings.emojis.downvote
+
+    repository = await benchmark_repository(args.backend, args.postgres_dsn, settings.database.sqlite_path)
+    # Repository calls are counted on every backend, SQL statements only on SQLite
+    metrics = Metrics(settings.metrics)
+    db = InstrumentedRepository(repository, metrics)
+
+    def queries() -> int:
+        return int(sum(count for _, count in metrics.db_queries.items()))
+
+    async with ClientSession() as aio_client:
+        async with MitBot(settings, db, aio_client) as bot:  # type: ignore
+            install_fake_http(bot, args.http_latency)
+            await bot.db.connect()
+            statements = StatementCounter()
+            if args.backend == "sqlite":
+                await repository.connection.set_trace_callback(statements)  # type: ignore
+            elif args.backend == "postgres":
+                await repository.pool.execute("TRUNCATE karma_messages")  # type: ignore
+            await bot.load_extension("cogs.karma")
+            # load_extension imports its own copy of the module, so no isinstance check against cogs.karma.Karma
+            cog = cast("Karma", bot.get_cog("Karma"))
+
+            state = bot._connection
+            guild = state._add_guild_from_data(guild_payload(guild_id, channel_id, AUTHOR_BASE_ID, "karma"))  # type: ignore
+            channel = guild.get_channel(channel_id)
+
+            # Messages: a long tail of authors, every post gets tracked
+            messages = [
+                discord.Message(
+                    state=state,
+                    channel=channel,  # type: ignore
+                    data=message_payload(
+                        MESSAGE_BASE_ID + i, channel_id, guild_id, AUTHOR_BASE_ID + rng.randrange(args.authors)
+                    ),  # type: ignore
+                )
+                for i in range(args.messages)
+            ]
+            statements.count = 0
+            queries_before = queries()
+            message_elapsed, message_timings = await run_stream(cog.on_message, messages, args.concurrency)
+            message_statements = statements.count
+            message_queries = queries() - queries_before
+
+            # Reactions: Zipf skew over posts, uniform over voters, a share of them being removals
+            members = [
+                discord.Member(data=member_payload(VOTER_BASE_ID + i), guild=guild, state=state)  # type: ignore
+                for i in range(args.voters)
+            ]
+            reactions = []
+            for message_index in zipf_choices(rng, args.messages, args.events, args.skew):
+                member = rng.choice(members)
+                event_type = "REACTION_REMOVE" if rng.random() < args.remove_ratio else "REACTION_ADD"
+                emoji = upvote if rng.random() < args.upvote_ratio else downvote
+                payload = RawReactionActionEvent(
+                    {
+                        "message_id": MESSAGE_BASE_ID + message_index,
+                        "channel_id": channel_id,
+                        "user_id": member.id,
+                        "guild_id": guild_id,
+                        "type": 0,
+                    },  # type: ignore
+                    emoji,
+                    event_type,  # type: ignore
+                )
+                if event_type == "REACTION_ADD":
+                    payload.member = member
+                reactions.append(payload)
+
+            async def on_reaction(payload: RawReactionActionEvent) -> None:
+                if payload.event_type == "REACTION_ADD":
+                    await cog.on_raw_reaction_add(payload)
+                else:
+                    await cog.on_raw_reaction_remove(payload)
+
+            statements.count = 0
+            queries_before = queries()
+            reaction_elapsed, reaction_timings = await run_stream(on_reaction, reactions, args.concurrency)
+            reaction_statements = statements.count
+            reaction_queries = queries() - queries_before
+
+            query_growth = await bench_query_growth(bot, channel_id, args.query_repeat)
+
+    return {
+        "benchmark": "karma",
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "environment": {
+            "backend": args.backend,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "discord.py": discord.__version__,
+            "machine": platform.machine(),
+        },
+        "parameters": {
+            key: value for key, value in vars(args).items() if key not in ("output", "compare", "db", "postgres_dsn")
+        },
+        "messages": {
+            "events": len(message_timings),
+            "events_per_second": len(message_timings) / message_elapsed,
+            "db_queries_per_event": message_queries / len(message_timings),
+            "db_statements_per_event": message_statements / len(message_timings) if args.backend == "sqlite" else None,
+            **latency_stats(message_timings),
+        },
+        "reactions": {
+            "events": len(reaction_timings),
+            "events_per_second": len(reaction_timings) / reaction_elapsed,
+            "db_queries_per_event": reaction_queries / len(reaction_timings),
+            "db_statements_per_event": (
+                reaction_statements / len(reaction_timings) if args.backend == "sqlite" else None
+            ),
+            **latency_stats(reaction_timings),
+        },
+        "karma_query": query_growth,
+    }
+
+
+def compare(current: dict[str, Any], previous: dict[str, Any]) -> str:
+    lines = [f"Compared with run from {previous['created_at']}:"]
+    for section in ("messages", "reactions"):
+        for key in ("events_per_second", "p50_ms", "p99_ms", "db_queries_per_event", "db_statements_per_event"):
+            before, after = previous[section].get(key), current[section].get(key)
+            if before is None or after is None:
+                continue
+            change = (after - before) / before * 100 if before else 0.0
+            lines.append(f"  {section}.{key}: {before:.3f} -> {after:.3f} ({change:+.1f}%)")
+    for before, after in zip(previous["karma_query"], current["karma_query"]):
+        lines.append(
+            f"  karma_query[{after['rows_per_author']} rows].p50_ms: {before['p50_ms']:.3f} -> {after['p50_ms']:.3f}"
+        )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000, help="tracked posts")
+    parser.add_argument("--authors", type=int, default=300, help="distinct post authors")
+    parser.add_argument("--voters", type=int, default=1000, help="distinct voting members")
+    parser.add_argument("--events", type=int, default=50000, help="reaction events")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of votes over posts")
+    parser.add_argument("--remove-ratio", type=float, default=0.1, help="share of reaction removals")
+    parser.add_argument("--upvote-ratio", type=float, default=0.8, help="share of upvotes")
+    parser.add_argument("--concurrency", type=int, default=32, help="events handled at the same time")
+    parser.add_argument("--http-latency", type=float, default=0.0, help="simulated Discord API latency, in seconds")
+    parser.add_argument("--query-repeat", type=int, default=50, help="/karma queries per author size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", choices=BACKENDS, default="sqlite", help="database backend to run on")
+    parser.add_argument("--postgres-dsn", help="scratch PostgreSQL database of the postgres backend")
+    parser.add_argument("--db", help="SQLite database to use (default: a temporary one)")
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path(datetime.now(timezone.utc).strftime("benchmarks/karma-%Y%m%d-%H%M%S.json")),
+    )
+    parser.add_argument("--compare", type=Path, help="previous result file to compare with")
+    args = parser.parse_args()
+
+    setup_logger()
+    logger.remove()  # the cog logs every vote
+    settings = offline_settings(args.db or str(Path(tempfile.mkdtemp()) / "bench.db"), loop_monitor=False)
+
+    result = asyncio.run(bench(args, settings))
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(result, indent=2))
+    print(json.dumps({key: result[key] for key in ("messages", "reactions", "karma_query")}, indent=2))
+    print(f"Results written to {args.output}")
+    if args.compare:
+        print(compare(result, json.loads(args.compare.read_text())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Per-query latency of the repository backends.
+
+Runs the same queries one at a time against each backend and reports their latency, to compare the
+direct drivers with the Prisma query engine. SQLite and Prisma get a temporary SQLite file each,
+PostgreSQL needs a scratch database: the benchmark creates its rows there and doesn't delete them.
+
+Usage (from the directory holding settings.toml, with src/ importable)::
+
+    python -m tools.bench_repository --backend sqlite --backend prisma
+    python -m tools.bench_repository --backend postgres --postgres-dsn postgresql://localhost/mitbot_bench
+
+The results are written as JSON (``--output``), like the karma benchmark.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import sqlite3
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from loguru import logger
+
+from core.database import Repository
+from core.log import setup_logger
+from tools.benchmarks import BACKENDS, benchmark_repository, latency_stats
+
+AUTHOR_BASE_ID = 300000000000000000
+VOTER_ID = 400000000000000000
+CHANNEL_ID = 500000000000000000
+HISTORY_PAGE_SIZE = 10
+
+
+async def timed(repeat: int, query: Callable[[int], Awaitable[Any]]) -> dict[str, float]:
+    timings = []
+    for index in range(repeat):
+        start = time.perf_counter()
+        await query(index)
+        timings.append(time.perf_counter() - start)
+    return latency_stats(timings)
+
+
+async def bench_backend(db: Repository, rows: int, repeat: int) -> dict[str, dict[str, float]]:
+    # Ids derived from the clock, so reruns against the same PostgreSQL database don't collide
+    first_id = time.time_ns()
+    created = [first_id + index for index in range(rows)]
+    author_id = AUTHOR_BASE_ID + first_id % 1000000
+    await db.connect()
+    try:
+        results = {
+            "create_karma_message": await timed(
+                rows, lambda index: db.create_karma_message(created[index], author_id, CHANNEL_ID)
+            )
+        }
+        results["add_karma_vote"] = await timed(
+            repeat, lambda index: db.add_karma_vote(created[index % len(created)], VOTER_ID, upvotes=1)
+        )
+        results["get_karma"] = await timed(repeat, lambda _: db.get_karma(author_id))
+        results["get_karma_history"] = await timed(
+            repeat, lambda _: db.get_karma_history(author_id, HISTORY_PAGE_SIZE, before=created[len(created) // 2])
+        )
+
+        codes = [f"bench{time.time_ns()}-{index}" for index in range(repeat)]
+        results["create_invite"] = await timed(repeat, lambda index: db.create_invite(codes[index], VOTER_ID))
+        results["pop_invite"] = await timed(repeat, lambda index: db.pop_invite(codes[index]))
+    finally:
+        await db.close()
+    return results
+
+
+async def bench(args: argparse.Namespace) -> dict[str, Any]:
+    results = {}
+    for backend in args.backend:
+        db = await benchmark_repository(backend, args.postgres_dsn)
+        logger.info(f"Benchmarking the {backend} backend")
+        results[backend] = await bench_backend(db, args.rows, args.repeat)
+    return {
+        "benchmark": "repository",
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "machine": platform.machine(),
+        },
+        "parameters": {"rows": args.rows, "repeat": args.repeat},
+        "backends": results,
+    }
+
+
+def summary(result: dict[str, Any]) -> str:
+    backends = list(result["backends"])
+    queries = list(next(iter(result["backends"].values())))
+    width = max(len(query) for query in queries)
+    lines = [f"{'p50 / p99 (ms)'.ljust(width)}  " + "  ".join(backend.rjust(17) for backend in backends)]
+    for query in queries:
+        cells = (
+            f"{result['backends'][backend][query]['p50_ms']:7.3f} / {result['backends'][backend][query]['p99_ms']:7.3f}"
+            for backend in backends
+        )
+        lines.append(f"{query.ljust(width)}  " + "  ".join(cells))
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", action="append", choices=BACKENDS, help="backend to run, repeatable")
+    parser.add_argument("--postgres-dsn", help="scratch PostgreSQL database of the postgres backend")
+    parser.add_argument("--rows", type=int, default=1000, help="karma messages created before the queries")
+    parser.add_argument("--repeat", type=int, default=2000, help="runs of each query")
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path(datetime.now(timezone.utc).strftime("benchmarks/repository-%Y%m%d-%H%M%S.json")),
+    )
+    args = parser.parse_args()
+    args.backend = args.backend or ["sqlite"]
+
+    setup_logger()
+    result = asyncio.run(bench(args))
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(result, indent=2))
+    print(summary(result))
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Helpers shared by the benchmarks."""
+
+import statistics
+import tempfile
+from pathlib import Path
+
+from core.database import Repository, create_repository
+from core.settings import DatabaseSettings
+
+BACKENDS = ("sqlite", "postgres", "prisma")
+
+
+def latency_stats(timings: list[float]) -> dict[str, float]:
+    if len(timings) < 2:
+        # statistics.quantiles needs at least two values
+        p50 = p99 = timings[0] if timings else 0.0
+    else:
+        quantiles = statistics.quantiles(timings, n=100, method="inclusive")
+        p50, p99 = quantiles[49], quantiles[98]
+    return {
+        "mean_ms": statistics.fmean(timings) * 1000 if timings else 0.0,
+        "p50_ms": p50 * 1000,
+        "p99_ms": p99 * 1000,
+        "max_ms": max(timings, default=0.0) * 1000,
+    }
+
+
+async def benchmark_repository(
+    backend: str, postgres_dsn: str | None = None, sqlite_path: str | None = None
+) -> Repository:
+    """Builds a repository of ``backend`` for a benchmark, not connected yet.
+
+    SQLite and Prisma use ``sqlite_path`` or a temporary file, PostgreSQL needs ``postgres_dsn``.
+    """
+    if backend == "postgres":
+        if postgres_dsn is None:
+            raise SystemExit("--postgres-dsn is required to benchmark the postgres backend")
+        return create_repository(DatabaseSettings(backend="postgres", postgres_dsn=postgres_dsn))
+
+    path = sqlite_path or str(Path(tempfile.mkdtemp()) / f"{backend}.db")
+    sqlite = create_repository(DatabaseSettings(backend="sqlite", sqlite_path=path))
+    if backend == "sqlite":
+        return sqlite
+
+    from core.database.prisma_repository import PrismaRepository
+
+    # Prisma doesn't create tables, the SQLite backend creates the same ones `prisma db push` would
+    await sqlite.connect()
+    await sqlite.close()
+    return PrismaRepository(f"file:{path}")
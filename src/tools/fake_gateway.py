@@ -0,0 +1,177 @@
+"""Minimal fake of the Discord gateway and HTTP API, to run the bot or a cluster locally.
+
+Serves just enough of the API for the bot to log in, and a gateway that identifies any shard and
+sends it the synthetic guilds that belong to it (``(guild_id >> 22) % shard_count``), so the
+launcher can be tried with several clusters without a real token or real guilds.
+
+Usage (from the directory holding settings.toml, with src/ importable)::
+
+    python -m tools.fake_gateway --guilds 40 --shards 4
+
+    # in another terminal
+    BOT__API_BASE=http://127.0.0.1:8790/api/v10 BOT__GATEWAY_URL=ws://127.0.0.1:8790/gateway \\
+        DATABASE__BACKEND=sqlite CLUSTER__CLUSTERS=2 python src/launcher.py
+"""
+
+import argparse
+import itertools
+import json
+from typing import Any
+
+from aiohttp import WSMsgType, web
+from loguru import logger
+
+from core.log import setup_logger
+from tools.fakes import guild_payload, member_payload, user_payload
+
+BOT_ID = 900000000000000000
+OWNER_ID = 900000000000000001
+GUILD_BASE_ID = 500000000000000000
+HEARTBEAT_INTERVAL = 41250
+
+# Gateway opcodes
+DISPATCH = 0
+HEARTBEAT = 1
+IDENTIFY = 2
+RESUME = 6
+REQUEST_MEMBERS = 8
+INVALID_SESSION = 9
+HELLO = 10
+HEARTBEAT_ACK = 11
+
+
+def json_response(data: Any) -> web.Response:
+    # discord.py only decodes bodies whose content type is exactly application/json, without a charset
+    return web.Response(body=json.dumps(data).encode(), content_type="application/json")
+
+
+class FakeDiscord:
+    def __init__(self, host: str, port: int, guilds: int, shards: int) -> None:
+        self.host = host
+        self.port = port
+        self.shards = shards
+        # Consecutive snowflake timestamps, so the guilds are spread evenly over the shards
+        self.guild_ids = [GUILD_BASE_ID + (i << 22) for i in range(guilds)]
+        self.sessions = itertools.count(1)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/gateway", self.gateway)
+        app.router.add_get("/api/v10/users/@me", self.current_user)
+        app.router.add_get("/api/v10/oauth2/applications/@me", self.application)
+        app.router.add_get("/api/v10/gateway", self.gateway_info)
+        app.router.add_get("/api/v10/gateway/bot", self.gateway_bot)
+        app.router.add_get("/api/v10/guilds/{guild_id}/invites", self.empty_list)
+        app.router.add_route("*", "/api/v10/{tail:.*}", self.no_content)
+        return app
+
+    @property
+    def gateway_url(self) -> str:
+        return f"ws://{self.host}:{self.port}/gateway"
+
+    async def current_user(self, request: web.Request) -> web.Response:
+        return json_response(user_payload(BOT_ID, bot=True))
+
+    async def application(self, request: web.Request) -> web.Response:
+        return json_response(
+            {
+                "id": str(BOT_ID),
+                "name": "mitbot",
+                "description": "",
+                "icon": None,
+                "bot_public": False,
+                "bot_require_code_grant": False,
+                "owner": user_payload(OWNER_ID),
+                "verify_key": "",
+                "flags": 0,
+            }
+        )
+
+    async def gateway_info(self, request: web.Request) -> web.Response:
+        return json_response({"url": self.gateway_url})
+
+    async def gateway_bot(self, request: web.Request) -> web.Response:
+        return json_response(
+            {
+                "url": self.gateway_url,
+                "shards": self.shards,
+                "session_start_limit": {"total": 1000, "remaining": 1000, "reset_after": 0, "max_concurrency": 1},
+            }
+        )
+
+    async def empty_list(self, request: web.Request) -> web.Response:
+        return json_response([])
+
+    async def no_content(self, request: web.Request) -> web.Response:
+        logger.debug(f"Unhandled {request.method} {request.path}")
+        return web.Response(status=204)
+
+    async def gateway(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        sequence = itertools.count(1)
+
+        async def send(op: int, data: Any, event: str | None = None) -> None:
+            message: dict[str, Any] = {"op": op, "d": data}
+            if op == DISPATCH:
+                message.update(s=next(sequence), t=event)
+            await ws.send_str(json.dumps(message))
+
+        await send(HELLO, {"heartbeat_interval": HEARTBEAT_INTERVAL})
+        async for frame in ws:
+            if frame.type != WSMsgType.TEXT:
+                continue
+            message = json.loads(frame.data)
+            op = message["op"]
+            if op == HEARTBEAT:
+                await send(HEARTBEAT_ACK, None)
+            elif op == IDENTIFY:
+                await self._identify(message["d"], send)
+            elif op == RESUME:
+                # Sessions aren't kept, the shard has to identify again
+                await send(INVALID_SESSION, False)
+            elif op == REQUEST_MEMBERS:
+                data = message["d"]
+                chunk = {"guild_id": data["guild_id"], "members": [], "chunk_index": 0, "chunk_count": 1}
+                if "nonce" in data:
+                    chunk["nonce"] = data["nonce"]
+                await send(DISPATCH, chunk, "GUILD_MEMBERS_CHUNK")
+        return ws
+
+    async def _identify(self, data: dict[str, Any], send: Any) -> None:
+        shard_id, shard_count = data.get("shard", [0, 1])
+        guild_ids = [guild_id for guild_id in self.guild_ids if (guild_id >> 22) % shard_count == shard_id]
+        logger.info(f"Shard {shard_id}/{shard_count} identified, sending {len(guild_ids)} guilds")
+        await send(
+            DISPATCH,
+            {
+                "v": 10,
+                "user": user_payload(BOT_ID, bot=True),
+                "guilds": [{"id": str(guild_id), "unavailable": True} for guild_id in guild_ids],
+                "session_id": f"session-{next(self.sessions)}",
+                "resume_gateway_url": self.gateway_url,
+                "shard": [shard_id, shard_count],
+                "application": {"id": str(BOT_ID), "flags": 0},
+            },
+            "READY",
+        )
+        for guild_id in guild_ids:
+            payload = guild_payload(guild_id, guild_id + 1, OWNER_ID, members=[member_payload(BOT_ID, bot=True)])
+            await send(DISPATCH, payload, "GUILD_CREATE")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--guilds", type=int, default=40, help="synthetic guilds spread over the shards")
+    parser.add_argument("--shards", type=int, default=4, help="shard count recommended by /gateway/bot")
+    args = parser.parse_args()
+
+    setup_logger()
+    fake = FakeDiscord(args.host, args.port, args.guilds, args.shards)
+    web.run_app(fake.app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import asyncio
+import itertools
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any
+
+import discord
+from discord.ext import commands
+from discord.http import HTTPClient, Route
+
+from core.settings import DatabaseSettings, LoopMonitorSettings, MetricsSettings, RecorderSettings, Settings
+
+
+def user_payload(user_id: int, bot: bool = False) -> dict[str, Any]:
+    return {"id": str(user_id), "username": f"user{user_id}", "discriminator": "0", "avatar": None, "bot": bot}
+
+
+def member_payload(user_id: int, bot: bool = False) -> dict[str, Any]:
+    return {
+        "user": user_payload(user_id, bot),
+        "roles": [],
+        "joined_at": "2020-01-01T00:00:00+00:00",
+        "deaf": False,
+        "mute": False,
+        "flags": 0,
+    }
+
+
+def guild_payload(
+    guild_id: int,
+    channel_id: int,
+    owner_id: int,
+    channel_name: str = "general",
+    members: list[dict[str, Any]] | None = None,
+) -> dict[str, Any]:
+    """A GUILD_CREATE payload of a guild with a single text channel."""
+    members = members or []
+    return {
+        "id": str(guild_id),
+        "name": f"guild {guild_id}",
+        "owner_id": str(owner_id),
+        "roles": [{"id": str(guild_id), "name": "@everyone", "permissions": "0", "position": 0, "color": 0}],
+        "channels": [
+            {"id": str(channel_id), "type": 0, "name": channel_name, "position": 0, "permission_overwrites": []}
+        ],
+        "members": members,
+        "member_count": len(members),
+        "emojis": [],
+        "stickers": [],
+        "features": [],
+        "threads": [],
+        "voice_states": [],
+        "presences": [],
+        "large": False,
+        "unavailable": False,
+    }
+
+
+def _snowflakes() -> itertools.count:
+    return itertools.count(discord.utils.time_snowflake(datetime.now(timezone.utc)))
+
+
+class FakeHTTPClient(HTTPClient):
+    """An HTTP client that answers the Discord API locally, so cogs can run without a live guild.
+
+    Only the routes the cogs use return meaningful payloads; anything else returns None as if it were
+    a 204 response. Every request is counted per route in :attr:`requests`, and can be delayed by
+    ``latency`` seconds to simulate the round trip to Discord.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, latency: float = 0.0) -> None:
+        super().__init__(loop)
+        self.latency = latency
+        self.requests: Counter[str] = Counter()
+        self.user: dict[str, Any] = {
+            "id": "0",
+            "username": "replay",
+            "discriminator": "0",
+            "avatar": None,
+            "bot": True,
+        }
+        self._ids = _snowflakes()
+
+    async def static_login(self, token: str) -> Any:
+        self.token = token
+        return self.user
+
+    async def close(self) -> None:
+        pass
+
+    async def request(self, route: Route, **kwargs: Any) -> Any:
+        self.requests[route.key] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if route.method in ("POST", "PATCH") and route.path.startswith("/channels/{channel_id}/messages"):
+            return self._message(route, kwargs.get("json") or {})
+        if route.method == "PATCH" and route.path == "/guilds/{guild_id}/members/{user_id}":
+            return member_payload(int(route.url.rsplit("/", 1)[-1]))
+        if route.method == "GET" and route.path.endswith("/invites"):
+            return []
+        return None
+
+    def _message(self, route: Route, payload: dict[str, Any]) -> dict[str, Any]:
+        message_id = route.url.rsplit("/", 1)[-1] if route.method == "PATCH" else str(next(self._ids))
+        return {
+            "id": message_id,
+            "channel_id": str(route.channel_id),
+            "author": self.user,
+            "content": payload.get("content") or "",
+            "embeds": payload.get("embeds") or [],
+            "attachments": [],
+            "mentions": [],
+            "mention_roles": [],
+            "mention_everyone": False,
+            "pinned": False,
+            "tts": False,
+            "type": 0,
+            "edited_timestamp": None,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        }
+
+
+def install_fake_http(bot: discord.Client, latency: float = 0.0) -> FakeHTTPClient:
+    """Replaces the HTTP client of a bot (and everything holding a reference to it) with a fake one.
+
+    Must be called after the bot entered its async context, when its loop is known.
+    """
+    http = FakeHTTPClient(bot.loop, latency)
+    bot.http = http
+    bot._connection.http = http
+    if isinstance(bot, commands.Bot):
+        bot.tree._http = http
+    return http
+
+
+def offline_settings(db_path: str, loop_monitor: bool = True) -> Settings:
+    """Loads the bot settings, pointed at a local SQLite database and with every exporter turned off."""
+    settings = Settings()  # type: ignore
+    settings.database = DatabaseSettings(backend="sqlite", sqlite_path=db_path)
+    settings.metrics = MetricsSettings(enabled=False)
+    settings.recorder = RecorderSettings(enabled=False)
+    settings.loop_monitor = LoopMonitorSettings(enabled=loop_monitor)
+    settings.cache.chunk_guild_ids = []  # chunking needs a gateway connection
+    return settings
@@ -0,0 +1,179 @@
+"""Replays a gateway recording into a MitBot running against a fake Discord HTTP layer.
+
+Usage (from the directory holding settings.toml, with src/ importable)::
+
+    python -m tools.replay recordings/gateway.ndjson.gz --speed 0 --db /tmp/replay.db
+
+``--speed 1`` replays at the recorded pace, ``--speed 0`` as fast as possible. Interaction events are
+skipped since discord.py answers them through its webhook adapter, which bypasses the HTTP client.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Coroutine
+
+from aiohttp import ClientSession
+from loguru import logger
+
+from core.database import create_repository
+from core.log import setup_logger
+from core.metrics import InstrumentedRepository, Metrics
+from core.recorder import read_recording
+from core.settings import Settings
+from main import MitBot
+from tools.fakes import install_fake_http, offline_settings
+
+SKIPPED_EVENTS = {"INTERACTION_CREATE"}
+# Events sent while connecting, before discord.py dispatches on_ready
+CONNECT_EVENTS = {"READY", "GUILD_CREATE"}
+WRITE_PREFIXES = ("create_", "add_", "pop_")
+
+
+class ReplayBot(MitBot):
+    """MitBot keeping the exact duration of every listener run."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.listener_timings: dict[str, list[float]] = defaultdict(list)
+
+    async def _run_event(
+        self,
+        coro: Callable[..., Coroutine[Any, Any, Any]],
+        event_name: str,
+        *args: Any,
+        **kwargs: Any,
+    ) -> None:
+        start = time.perf_counter()
+        try:
+            await super()._run_event(coro, event_name, *args, **kwargs)
+        finally:
+            self.listener_timings[getattr(coro, "__qualname__", event_name)].append(time.perf_counter() - start)
+
+
+def percentile(values: list[float], q: float) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q * 100) - 1]
+
+
+def summarize(timings: list[float]) -> dict[str, float]:
+    return {
+        "count": len(timings),
+        "mean_ms": statistics.fmean(timings) * 1000,
+        "p50_ms": percentile(timings, 0.50) * 1000,
+        "p99_ms": percentile(timings, 0.99) * 1000,
+        "max_ms": max(timings) * 1000,
+    }
+
+
+async def replay(
+    recording: Path,
+    settings: Settings,
+    speed: float,
+    http_latency: float = 0.0,
+    drain_timeout: float = 5.0,
+) -> dict[str, Any]:
+    metrics = Metrics(settings.metrics)
+    db = InstrumentedRepository(create_repository(settings.database), metrics)
+    async with ClientSession() as aio_client:
+        async with ReplayBot(settings, db, aio_client) as bot:  # type: ignore
+            http = install_fake_http(bot, http_latency)
+            bot._connection.guild_ready_timeout = 0.1
+            await bot.db.connect()
+            await bot.setup_hook()
+
+            events = skipped = 0
+            connecting = True
+            seen_ready = False
+            started_at = time.perf_counter()
+            for ts, name, payload in read_recording(recording):
+                if connecting and name not in CONNECT_EVENTS:
+                    # Cogs expect on_ready to have run before the rest of the traffic, like on a live gateway
+                    connecting = False
+                    if seen_ready:
+                        await bot.wait_until_ready()
+                    started_at = time.perf_counter() - (ts / speed if speed else 0)
+
+                parser = bot._connection.parsers.get(name)
+                if name in SKIPPED_EVENTS or parser is None:
+                    skipped += 1
+                    continue
+                if name == "READY":
+                    seen_ready = True
+                    http.user = payload["user"]
+
+                if speed and not connecting:
+                    delay = started_at + ts / speed - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                parser(payload)
+                events += 1
+                # Let the listeners scheduled by this event start, as the gateway reader would
+                await asyncio.sleep(0)
+
+            dispatch_elapsed = time.perf_counter() - started_at
+            current = asyncio.current_task()
+            pending = [
+                task
+                for task in asyncio.all_tasks()
+                if task is not current and task.get_name().startswith("discord.py: ")
+            ]
+            unfinished = 0
+            if pending:
+                _, still_running = await asyncio.wait(pending, timeout=drain_timeout)
+                unfinished = len(still_running)
+                for task in still_running:
+                    task.cancel()
+            elapsed = time.perf_counter() - started_at
+
+            db_writes = {
+                labels["action"]: int(count)
+                for labels, count in metrics.db_queries.items()
+                if labels["action"].startswith(WRITE_PREFIXES)
+            }
+            return {
+                "recording": str(recording),
+                "speed": speed,
+                "events": events,
+                "skipped_events": skipped,
+                "dispatch_seconds": dispatch_elapsed,
+                "total_seconds": elapsed,
+                "events_per_second": events / elapsed if elapsed else 0.0,
+                "unfinished_listeners": unfinished,
+                "listeners": {name: summarize(timings) for name, timings in sorted(bot.listener_timings.items())},
+                "db_writes": db_writes,
+                "db_writes_total": sum(db_writes.values()),
+                "http_requests": dict(http.requests),
+            }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", type=Path, help="file written by the gateway recorder")
+    parser.add_argument("--speed", type=float, default=0.0, help="1 = recorded pace, 0 = as fast as possible")
+    parser.add_argument("--db", help="SQLite database to write to (default: a temporary one)")
+    parser.add_argument("--http-latency", type=float, default=0.0, help="simulated Discord API latency, in seconds")
+    parser.add_argument("--drain-timeout", type=float, default=5.0, help="how long to wait for running listeners")
+    parser.add_argument("--output", type=Path, help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    setup_logger()
+    logger.remove()  # listeners log every event, keep the output to the report
+    settings = offline_settings(args.db or str(Path(tempfile.mkdtemp()) / "replay.db"))
+
+    report = asyncio.run(replay(args.recording, settings, args.speed, args.http_latency, args.drain_timeout))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
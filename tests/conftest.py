@@ -0,0 +1,42 @@
+"""Shared fixtures. The PostgreSQL tests only run when TEST_POSTGRES_DSN points at a scratch database,
+every table of the bot in it is emptied before each test."""
+
+import os
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, Callable
+
+import pytest
+
+from core.database import Repository, create_repository
+from core.settings import DatabaseSettings
+
+TABLES = ("karma_messages", "invites", "join_events", "inviter_stats")
+
+
+def database_settings(backend: str, tmp_path: Path) -> DatabaseSettings:
+    if backend == "postgres":
+        dsn = os.environ.get("TEST_POSTGRES_DSN")
+        if dsn is None:
+            pytest.skip("TEST_POSTGRES_DSN is not set")
+        return DatabaseSettings(backend="postgres", postgres_dsn=dsn, pool_max_size=4)
+    return DatabaseSettings(backend="sqlite", sqlite_path=str(tmp_path / "test.db"))
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def repository(request: pytest.FixtureRequest, tmp_path: Path) -> Callable:
+    """Opens a connected repository of each direct backend, on an empty database."""
+    settings = database_settings(request.param, tmp_path)
+
+    @asynccontextmanager
+    async def connected() -> AsyncIterator[Repository]:
+        db = create_repository(settings)
+        await db.connect()
+        if settings.backend == "postgres":
+            await db.pool.execute(f"TRUNCATE {', '.join(TABLES)}")  # type: ignore
+        try:
+            yield db
+        finally:
+            await db.close()
+
+    return connected
@@ -0,0 +1,34 @@
+from types import SimpleNamespace
+
+import yarl
+from discord.http import Route
+
+from core.ratelimit import RateLimitBudget, route_key
+from core.settings import RateLimitSettings
+
+CHANNEL = 100000000000000003
+
+
+def response(remaining: int) -> SimpleNamespace:
+    headers = {
+        "X-RateLimit-Bucket": "reactions",
+        "X-RateLimit-Limit": "5",
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset-After": "1.0",
+    }
+    return SimpleNamespace(status=204, headers=headers)
+
+
+def test_routes_keyed_by_template():
+    budget = RateLimitBudget(RateLimitSettings())
+    for message_id in range(CHANNEL + 1, CHANNEL + 5001):
+        url = yarl.URL(f"{Route.BASE}/channels/{CHANNEL}/messages/{message_id}/reactions/%E2%AC%86%EF%B8%8F/@me")
+        budget._update("PUT", url, response(4))  # type: ignore
+
+    assert len(budget.routes) == 1
+    assert len(budget.buckets) == 1
+    route = route_key("PUT", f"/channels/{CHANNEL}/messages/{CHANNEL + 1}/reactions/x/@me")
+    bucket = budget.bucket_for(route)
+    assert bucket is not None and bucket.remaining == 4
+    # Other channels have their own bucket
+    assert budget.bucket_for(route_key("PUT", f"/channels/{CHANNEL + 1}/messages/1/reactions/x/@me")) is None
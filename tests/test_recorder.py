@@ -0,0 +1,70 @@
+import asyncio
+import socket
+from pathlib import Path
+
+import pytest
+import yarl
+from aiohttp import ClientSession, web
+from discord.gateway import DiscordWebSocket
+from discord.http import Route
+
+from core.database import create_repository
+from core.recorder import read_recording
+from core.settings import RecorderSettings
+from main import MitBot
+from tools.fake_gateway import FakeDiscord
+from tools.fakes import offline_settings
+from tools.replay import replay
+
+GUILDS = 3
+
+
+def unused_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def fake_discord(monkeypatch: pytest.MonkeyPatch) -> FakeDiscord:
+    # settings.toml is read from the working directory
+    monkeypatch.chdir(Path(__file__).parents[1])
+    fake = FakeDiscord("127.0.0.1", unused_port(), GUILDS, shards=1)
+    monkeypatch.setattr(Route, "BASE", f"http://127.0.0.1:{fake.port}/api/v10")
+    monkeypatch.setattr(DiscordWebSocket, "DEFAULT_GATEWAY", yarl.URL(fake.gateway_url))
+    return fake
+
+
+async def record_session(fake: FakeDiscord, tmp_path: Path) -> Path:
+    runner = web.AppRunner(fake.app())
+    await runner.setup()
+    await web.TCPSite(runner, fake.host, fake.port).start()
+    settings = offline_settings(str(tmp_path / "record.db"), loop_monitor=False)
+    settings.bot.initial_extensions = []
+    settings.recorder = RecorderSettings(enabled=True, path=str(tmp_path / "gateway.ndjson.gz"))
+    try:
+        async with ClientSession() as session:
+            async with MitBot(settings, create_repository(settings.database), session) as bot:
+                running = asyncio.create_task(bot.start("token"))
+                await asyncio.wait_for(bot.wait_until_ready(), 10)
+                assert len(bot.guilds) == GUILDS
+                await bot.close()
+                await running
+                assert bot.recorder is not None
+                return bot.recorder.path
+    finally:
+        await runner.cleanup()
+
+
+def test_record_and_replay_a_session(fake_discord: FakeDiscord, tmp_path: Path):
+    recording = asyncio.run(record_session(fake_discord, tmp_path))
+
+    events = [name for _, name, _ in read_recording(recording)]
+    assert events == ["READY"] + ["GUILD_CREATE"] * GUILDS
+
+    settings = offline_settings(str(tmp_path / "replay.db"), loop_monitor=False)
+    settings.bot.initial_extensions = []
+    report = asyncio.run(replay(recording, settings, speed=0))
+    assert report["events"] == len(events)
+    assert report["skipped_events"] == 0
+    assert report["unfinished_listeners"] == 0
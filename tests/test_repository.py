@@ -0,0 +1,112 @@
+import asyncio
+from datetime import datetime, timezone
+
+from core.database import ALL_TIME, KarmaRecord, month_key
+
+AUTHOR = 100000000000000001
+VOTER = 100000000000000002
+CHANNEL = 100000000000000003
+GUILD = 100000000000000004
+
+
+def test_karma_votes(repository):
+    async def scenario():
+        async with repository() as db:
+            await db.create_karma_message(1, AUTHOR, CHANNEL)
+            await db.create_karma_message(2, AUTHOR, CHANNEL)
+
+            assert await db.add_karma_vote(1, VOTER, upvotes=1)
+            assert await db.add_karma_vote(2, VOTER, upvotes=1)
+            assert await db.add_karma_vote(2, VOTER + 1, downvotes=1)
+            assert await db.add_karma_vote(1, VOTER, upvotes=-1)
+            # Own messages and untracked ones can't be voted on
+            assert not await db.add_karma_vote(1, AUTHOR, upvotes=1)
+            assert not await db.add_karma_vote(3, VOTER, upvotes=1)
+
+            assert await db.get_karma(AUTHOR) == 0
+            assert await db.get_karma(VOTER) == 0
+
+    asyncio.run(scenario())
+
+
+def test_karma_history_pages(repository):
+    async def scenario():
+        async with repository() as db:
+            for message_id in range(1, 26):
+                await db.create_karma_message(message_id, AUTHOR if message_id % 2 else VOTER, CHANNEL)
+
+            newest = await db.get_karma_history(AUTHOR, 5)
+            assert [record.message_id for record in newest] == [25, 23, 21, 19, 17]
+            older = await db.get_karma_history(AUTHOR, 5, before=17)
+            assert [record.message_id for record in older] == [15, 13, 11, 9, 7]
+            newer = await db.get_karma_history(AUTHOR, 5, after=15)
+            assert newer == newest
+            last = await db.get_karma_history(AUTHOR, 5, before=7)
+            assert [record.message_id for record in last] == [5, 3, 1]
+            assert last[0] == KarmaRecord(5, AUTHOR, CHANNEL, 0, 0)
+
+    asyncio.run(scenario())
+
+
+def test_karma_chunks_cover_the_table(repository):
+    async def scenario():
+        async with repository() as db:
+            for message_id in range(1, 12):
+                await db.create_karma_message(message_id, AUTHOR, CHANNEL)
+
+            seen = []
+            after = None
+            while chunk := await db.get_karma_chunk(after, 4):
+                seen.extend(record.message_id for record in chunk)
+                after = chunk[-1].message_id
+            assert seen == list(range(1, 12))
+
+    asyncio.run(scenario())
+
+
+def test_invites(repository):
+    async def scenario():
+        async with repository() as db:
+            await db.create_invite("abc", AUTHOR)
+            assert await db.pop_invite("abc") == AUTHOR
+            assert await db.pop_invite("abc") is None
+
+    asyncio.run(scenario())
+
+
+def test_join_stats(repository):
+    async def scenario():
+        async with repository() as db:
+            january = datetime(2024, 1, 15, tzinfo=timezone.utc)
+            february = datetime(2024, 2, 1, tzinfo=timezone.utc)
+            await db.record_join(GUILD, 1, AUTHOR, january)
+            await db.record_join(GUILD, 2, AUTHOR, february)
+            await db.record_join(GUILD, 3, VOTER, february)
+            await db.record_join(GUILD, 4, None, february)
+
+            assert await db.get_top_inviters(GUILD, ALL_TIME) == [(AUTHOR, 2), (VOTER, 1)]
+            assert sorted(await db.get_top_inviters(GUILD, month_key(february))) == [(AUTHOR, 1), (VOTER, 1)]
+            assert await db.get_inviter_joins(GUILD, AUTHOR, month_key(january)) == 1
+            assert await db.get_inviter_joins(GUILD + 1, AUTHOR, ALL_TIME) == 0
+
+    asyncio.run(scenario())
+
+
+def test_join_stats_concurrent_writes(repository):
+    async def scenario():
+        async with repository() as db:
+            joined_at = datetime(2024, 2, 1, tzinfo=timezone.utc)
+
+            async def karma(message_id: int) -> None:
+                await db.create_karma_message(message_id, AUTHOR, CHANNEL)
+                await db.add_karma_vote(message_id, VOTER, upvotes=1)
+
+            await asyncio.gather(
+                *(db.record_join(GUILD, member_id, VOTER, joined_at) for member_id in range(20)),
+                *(karma(message_id) for message_id in range(20)),
+            )
+
+            assert await db.get_inviter_joins(GUILD, VOTER, ALL_TIME) == 20
+            assert await db.get_karma(AUTHOR) == 20
+
+    asyncio.run(scenario())
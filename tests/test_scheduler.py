@@ -0,0 +1,125 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from core.scheduler import Cron, Scheduler
+
+
+def test_cron_step_from_start():
+    assert sorted(Cron("5/10 * * * *").minutes) == [5, 15, 25, 35, 45, 55]
+
+
+def test_cron_rejects_impossible_expression():
+    with pytest.raises(ValueError):
+        Cron("0 0 30 2 *")
+
+
+def test_cron_rare_expression():
+    # Feb 29 on a Monday
+    cron = Cron("0 0 29 2 1")
+    assert cron.next_run(datetime(2024, 3, 1, tzinfo=timezone.utc)) == datetime(2044, 2, 29, tzinfo=timezone.utc)
+
+
+def test_overlapping_runs_are_skipped():
+    async def scenario():
+        scheduler = Scheduler()
+        job = scheduler.add_job("slow", lambda: asyncio.sleep(0.12), interval=0.05)
+        scheduler.start()
+        await asyncio.sleep(0.4)
+        await scheduler.close()
+        assert job.runs >= 2
+        assert job.skipped >= 2
+        assert job.failures == job.timeouts == 0
+
+    asyncio.run(scenario())
+
+
+def test_max_concurrency():
+    running = 0
+    peak = 0
+
+    async def slow():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        try:
+            await asyncio.sleep(0.12)
+        finally:
+            running -= 1
+
+    async def scenario():
+        scheduler = Scheduler()
+        job = scheduler.add_job("slow", slow, interval=0.05, max_concurrency=2)
+        scheduler.start()
+        await asyncio.sleep(0.4)
+        await scheduler.close()
+        assert peak == 2
+        assert job.skipped >= 1
+
+    asyncio.run(scenario())
+
+
+def test_timeouts_and_failures():
+    async def fail():
+        raise RuntimeError("boom")
+
+    async def scenario():
+        scheduler = Scheduler()
+        stuck = scheduler.add_job("stuck", lambda: asyncio.sleep(10), interval=0.05, timeout=0.02)
+        failing = scheduler.add_job("failing", fail, interval=0.05)
+        scheduler.start()
+        await asyncio.sleep(0.25)
+        await scheduler.close()
+        assert stuck.timeouts >= 2 and stuck.timeouts == stuck.runs
+        assert stuck.failures == 0
+        assert failing.failures >= 2 and failing.failures == failing.runs
+        assert failing.last_error == "RuntimeError('boom')"
+
+    asyncio.run(scenario())
+
+
+def test_remove_owner_flush_or_cancel():
+    finished = []
+
+    async def work(name: str) -> None:
+        await asyncio.sleep(0.1)
+        finished.append(name)
+
+    async def scenario():
+        scheduler = Scheduler()
+        flushed = scheduler.add_job("flushed", lambda: work("flushed"), interval=3600, owner="flush")
+        cancelled = scheduler.add_job("cancelled", lambda: work("cancelled"), interval=0.01, owner="cancel")
+        scheduler.start()
+        await asyncio.sleep(0.05)
+        assert cancelled.running
+
+        await scheduler.remove_owner("cancel")
+        await scheduler.remove_owner("flush", flush=True)
+        assert flushed.runs == 1
+        assert finished == ["flushed"]
+        assert not cancelled.running
+        assert scheduler.jobs == {}
+        await scheduler.close()
+
+    asyncio.run(scenario())
+
+
+def test_close_cancels_delayed_calls():
+    called = []
+
+    async def call() -> None:
+        called.append(True)
+
+    async def scenario():
+        scheduler = Scheduler()
+        scheduler.start()
+        task = scheduler.call_later(10, call)
+        soon = scheduler.call_later(0, call)
+        await asyncio.sleep(0.01)
+        await scheduler.close()
+        assert soon.done() and not soon.cancelled()
+        assert task.cancelled()
+        assert called == [True]
+
+    asyncio.run(scenario())